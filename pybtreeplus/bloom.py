@@ -0,0 +1,136 @@
+import math
+import hashlib
+
+from pyheapfile.heap import to_bytes, from_bytes
+
+BLOOM_MAGIC = bytes([0xBF, 0x7E, 0xB1, 0x01])
+
+# default false positive rate
+BLOOM_FP_RATE = 0.01
+# smallest capacity of a filter
+BLOOM_MIN_CAPACITY = 0x100
+# rebuild after this fraction of the keys was deleted
+BLOOM_STALE = 0.25
+
+SIZE_SIZE = 8
+RATE_SIZE = 4
+# fp_rate is stored in parts per million
+RATE_SCALE = 1000000
+
+
+class BloomFilter(object):
+    """bloom filter over the encoded keys of a tree.
+
+    sized for capacity keys at fp_rate, max_bytes limits the bit array
+    and raises the false positive rate instead. deleted keys cannot be
+    removed, they are counted to tell when a rebuild is due."""
+
+    def __init__(self, capacity, fp_rate=BLOOM_FP_RATE, max_bytes=None):
+        self.capacity = max(capacity, BLOOM_MIN_CAPACITY)
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes
+
+        nbits = -self.capacity * math.log(fp_rate) / (math.log(2) ** 2)
+        nbytes = int(math.ceil(nbits / 8))
+        if max_bytes != None:
+            nbytes = min(nbytes, max_bytes)
+        self.nbits = nbytes * 8
+        self.hashes = max(1, int(round(self.nbits / self.capacity * math.log(2))))
+        self.bits = bytearray(nbytes)
+
+        self.added = 0
+        self.deleted = 0
+        self.dirty = True
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( bits: "
+            + str(self.nbits)
+            + " hashes: "
+            + str(self.hashes)
+            + " added: "
+            + str(self.added)
+            + " deleted: "
+            + str(self.deleted)
+            + " )"
+        )
+
+    def _positions(self, buf):
+        digest = hashlib.blake2b(buf, digest_size=16).digest()
+        h1 = from_bytes(digest[:8])
+        h2 = from_bytes(digest[8:]) | 1
+        for i in range(0, self.hashes):
+            yield (h1 + i * h2) % self.nbits
+
+    def add(self, buf):
+        for pos in self._positions(buf):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.added += 1
+        self.dirty = True
+
+    def remove(self):
+        self.deleted += 1
+        self.dirty = True
+
+    def __contains__(self, buf):
+        for pos in self._positions(buf):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def keys(self):
+        """number of keys added and not deleted since"""
+        return max(self.added - self.deleted, 0)
+
+    def stale(self):
+        """tells if a rebuild is due"""
+        if self.added > self.capacity:
+            return True
+        return self.deleted > max(self.keys(), BLOOM_MIN_CAPACITY) * BLOOM_STALE
+
+    def renew(self, count):
+        """an empty filter with the same settings, sized for count keys"""
+        return BloomFilter(
+            max(count * 2, BLOOM_MIN_CAPACITY),
+            fp_rate=self.fp_rate,
+            max_bytes=self.max_bytes,
+        )
+
+    # persistence methods
+
+    def to_bytes(self):
+        buf = []
+        buf.extend(BLOOM_MAGIC)
+        buf.extend(to_bytes(self.capacity, SIZE_SIZE))
+        buf.extend(to_bytes(int(self.fp_rate * RATE_SCALE), RATE_SIZE))
+        buf.extend(to_bytes(self.max_bytes if self.max_bytes else 0, SIZE_SIZE))
+        buf.extend(to_bytes(self.added, SIZE_SIZE))
+        buf.extend(to_bytes(self.deleted, SIZE_SIZE))
+        buf.extend(self.bits)
+        return bytes(buf)
+
+    @staticmethod
+    def from_bytes(buf):
+        if bytes(buf[: len(BLOOM_MAGIC)]) != BLOOM_MAGIC:
+            raise Exception("no bloom filter")
+        buf = buf[len(BLOOM_MAGIC) :]
+
+        capacity = from_bytes(buf[:SIZE_SIZE])
+        buf = buf[SIZE_SIZE:]
+        fp_rate = from_bytes(buf[:RATE_SIZE]) / RATE_SCALE
+        buf = buf[RATE_SIZE:]
+        max_bytes = from_bytes(buf[:SIZE_SIZE])
+        buf = buf[SIZE_SIZE:]
+
+        bloom = BloomFilter(capacity, fp_rate, max_bytes if max_bytes else None)
+        bloom.added = from_bytes(buf[:SIZE_SIZE])
+        buf = buf[SIZE_SIZE:]
+        bloom.deleted = from_bytes(buf[:SIZE_SIZE])
+        buf = buf[SIZE_SIZE:]
+
+        if len(buf) != len(bloom.bits):
+            raise Exception("bloom filter size broken", len(buf), len(bloom.bits))
+        bloom.bits = bytearray(buf)
+        bloom.dirty = False
+        return bloom
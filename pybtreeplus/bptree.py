@@ -1,27 +1,78 @@
+from bisect import bisect_left, bisect_right
+
 from pyheapfile.heap import HeapFile, to_bytes, from_bytes
 from pydllfile.dllist import DoubleLinkedListFile, LINK_SIZE
 from pybtreecore.btcore import BTreeElement, BTreeCoreFile
 from pybtreecore.btcore import KEYS_PER_NODE, KEY_SIZE, DATA_SIZE
 from pybtreecore.btnodelist import Node, NodeList
 
+from .btcompact import CompactElement
+from .codec import pack_nodes, unpack_nodes, is_packed, get_codec
+from .codec import is_paged, page_size, page_stub, read_stub
+from .btheap import alloc_page, read_page, write_page, free_page
+from .bloom import BloomFilter, BLOOM_FP_RATE
+from .hashindex import AdaptiveHashIndex, HASH_KEYS, HASH_HOT
+from .durability import GroupCommit, fsync_path, GROUP_INTERVAL_MS, GROUP_COMMITS
+from .durability import DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_GROUP
+from .writeback import WriteBack, WRITE_BACK_ELEMS, WRITE_BACK_INTERVAL_MS
+from .memtable import TOMBSTONE
+from .verify import Verifier
+from .bulk import BulkLoader, BULK_FILL
+from . import dump as _dump
+
+# persistent tree header, see BPlusTree.create() and BPlusTree.open()
+HEADER_MAGIC = bytes([0xBF, 0x7E, 0xE0, 0x01])
+HEADER_SIZE = 0x40
+COUNT_SIZE = 8
+CONFIG_SIZE = 4
+
 # from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
 
 
 class Context(object):
+    """use as context manager to call done() at the end,
+    or abort() if an exception is raised"""
+
     def __init__(self, bpt):
         self.bpt = bpt
         self._reset()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None:
+            self.done()
+        else:
+            self.abort()
+        return False
+
     def _reset(self):
         self.elems = {}
+        # read-only elements in compact form
+        self.pages = {}
         self._dirty = set()
         self._free = []
+        # elements allocated in the heap by this context
+        self._created = []
+        # positions from the root down to the leaf of the last search_node()
+        self.path = []
+        # inner elements on the path, decoded in full while searching
+        self._decoded = {}
+        # neighbours with changed links only, pos -> (heap_node, dll_elem)
+        self._links = {}
+        # called when the changes are written, or dropped
+        self._on_done = []
+        self._on_abort = []
+        # tree header to restore on abort
+        self._saved_header = self.bpt._header_state()
 
     def add(self, btelem):
         if btelem == None:
             raise Exception("None not allowed")
         pos = btelem.elem.pos
         self.elems[pos] = btelem
+        self.pages.pop(pos, None)
         return btelem
 
     def create_empty_list(self):
@@ -31,6 +82,7 @@ class Context(object):
             print("re-use formerly freed element node")
         else:
             btelem = self.bpt.btcore.create_empty_list()
+            self._created.append(btelem)
         # todo not added automatically to context !!!
         # todo not marked as dirty here yet ?
         # self.add(btelem)
@@ -46,42 +98,137 @@ class Context(object):
     def _read_elem(self, pos):
         if pos in self.elems:
             return self.elems[pos]
-        el = self.bpt._read_elem(pos)
+        el = self._decoded.pop(pos, None)
+        if el == None:
+            el = self.bpt._read_elem(pos)
+        links = self._links.pop(pos, None)
+        if links != None:
+            # keep the links changed meanwhile
+            el.elem.prev = links[1].prev
+            el.elem.succ = links[1].succ
         return self.add(el)
 
+    def _begin_path(self):
+        self.path = []
+        self._decoded = {}
+
+    def _read_path(self, pos):
+        """read an element on the way down and record it in path.
+        inner elements read from disk are kept in full as well,
+        a split or rebalance along the path then reuses them"""
+        self.path.append(pos)
+        return self._read_compact(pos, keep=True)
+
+    def _read_compact(self, pos, keep=False):
+        if pos in self.elems or pos in self._links:
+            return CompactElement.from_btelem(self._read_elem(pos))
+        page = self.bpt.pinned.get(pos)
+        if page != None:
+            return page
+        if pos in self.pages:
+            return self.pages[pos]
+        cache = self.bpt.cache
+        if cache != None:
+            page = cache.get(pos)
+            if page != None:
+                return page
+        btelem = self.bpt._read_elem(pos)
+        page = CompactElement.from_btelem(btelem)
+        if cache != None:
+            cache.put(page)
+        if page.leaf == True:
+            # leafs are handed out for modification, keep them in full form
+            self.add(btelem)
+        else:
+            self.pages[pos] = page
+            if keep == True:
+                self._decoded[pos] = btelem
+        return page
+
     def _write_elem(self, btelem):
         pos = btelem.elem.pos
         self.elems[pos] = btelem
+        self.pages.pop(pos, None)
         self._dirty.add(pos)
 
     def _read_dll_elem(self, pos):
-        btelem = self._read_elem(pos)
-        # todo read just required parts?
-        heap_node, dll_elem = btelem.node, btelem.elem
-        return heap_node, dll_elem
+        if pos in self.elems:
+            btelem = self.elems[pos]
+            return btelem.node, btelem.elem
+        if pos not in self._links:
+            # only the links change, the node list is not decoded
+            self._links[pos] = self.bpt._read_dll_elem(pos)
+        return self._links[pos]
 
     def _write_dll_elem(self, heap_node, dll_elem):
         pos = dll_elem.pos
-        btelem = self.elems[pos]
         self._dirty.add(pos)
+        if pos not in self.elems:
+            self._links[pos] = (heap_node, dll_elem)
+            return
+        btelem = self.elems[pos]
         btelem.node = heap_node
         btelem.elem = dll_elem
 
+    def _write_changes(self):
+        # in order of file offset, a split cascade then writes mostly forward
+        for pos in sorted(self._dirty):
+            if pos in self.elems:
+                self.bpt._write_elem(self.elems[pos])
+            elif pos in self._links:
+                self.bpt._write_dll_elem(*self._links[pos])
+        for btelem in sorted(self._free, key=lambda x: x.elem.pos):
+            self.bpt._free_elem(btelem)
+        for func in self._on_done:
+            func()
+
+    def on_done(self, func):
+        """call func after the changes are written, e.g. to free storage
+        a deleted key referenced"""
+        self._on_done.append(func)
+
+    def on_abort(self, func):
+        """call func when the changes are dropped, e.g. to free storage
+        allocated for a key not inserted then"""
+        self._on_abort.append(func)
+
+    def _discard(self):
+        """drop all changes, and release the elements allocated meanwhile"""
+        for func in self._on_abort:
+            func()
+        for btelem in self._created:
+            self.bpt._free_elem(btelem)
+        self._reset()
+
     def done(self):
-        for pos, btelem in self.elems.items():
-            if pos in self._dirty:
-                self.bpt._write_elem(btelem)
-        for btelem in self._free:
-            self.bpt.btcore.heap_fd.free(btelem.node, merge_free=False)
+        self._write_changes()
+        # header goes last, after all elements it refers to are written
+        self.bpt._write_header_changed()
+        self.bpt._committed()
         self._reset()
 
+    def abort(self):
+        """drop all changes, restore the tree header to the state
+        when the context was created, or last done"""
+        state = self._saved_header
+        self._discard()
+        self.bpt._restore_header_state(state)
+
     def close(self):
         self.done()
 
 
 class BPlusTree(object):
     def __init__(
-        self, btcore, root_pos=0, first_pos=0, last_pos=0, conv_key=None, conv_data=None
+        self,
+        btcore,
+        root_pos=0,
+        first_pos=0,
+        last_pos=0,
+        conv_key=None,
+        conv_data=None,
+        codec=None,
+        cache=None,
     ):
         self.trace = False
 
@@ -91,6 +238,47 @@ class BPlusTree(object):
         self.conv_key = conv_key
         self.conv_data = conv_data
 
+        # optional compression of the elements, see codec.py
+        self.codec = codec
+
+        # optional ElementCache, can be shared by trees in the same heap
+        self.cache = cache
+
+        self.count = 0
+
+        # element position -> number of writes and frees through this tree,
+        # lets a `Cursor` tell if its leaf changed
+        self._versions = {}
+
+        # optional BloomFilter over the keys, see enable_bloom()
+        self.bloom = None
+        self.bloom_node = None
+        self._bloom_size = 0
+
+        # optional AdaptiveHashIndex for hot keys, see enable_hash_index()
+        self.hash_index = None
+
+        # inner elements of the upper levels in compact form, see pin_levels()
+        self.pinned = {}
+        # position -> level of the pinned elements, the root is level 0
+        self._pin_level = {}
+        self._pin_levels = 0
+        self._pin_root = 0
+
+        # see set_durability()
+        self.durability = DURABILITY_NONE
+        self.group_commit = None
+
+        # optional WriteBack of dirty elements, see enable_write_back()
+        self.write_back = None
+
+        # persistent header, only set with create() or open()
+        self.header_node = None
+        self.path = None
+        self._header_buf = None
+        # header as last written to disk
+        self._header_disk = None
+
         self.root_pos = root_pos
         self.first_pos = first_pos
         self.last_pos = last_pos
@@ -104,6 +292,8 @@ class BPlusTree(object):
             + hex(self.first_pos)
             + " last: "
             + hex(self.last_pos)
+            + " count: "
+            + str(self.count)
             + " )"
         )
 
@@ -128,6 +318,278 @@ class BPlusTree(object):
             return self, buf
         return self
 
+    def _split(self, buf, size):
+        return buf[:size], buf[size:]
+
+    def header_to_bytes(self):
+        buf = []
+        buf.extend(HEADER_MAGIC)
+        buf.extend(self.to_bytes())
+        buf.extend(to_bytes(self.count, COUNT_SIZE))
+        buf.extend(to_bytes(self.bloom_pos, self.link_size))
+        # a filter not written since the last change is rebuilt on open
+        current = self.bloom != None and self.bloom.dirty == False
+        buf.extend(to_bytes(1 if current else 0, 1))
+        buf.extend(to_bytes(self.btcore.keys_per_node, CONFIG_SIZE))
+        buf.extend(to_bytes(self.codec.codec_id if self.codec else 0, CONFIG_SIZE))
+        return bytes(buf)
+
+    @staticmethod
+    def _header_config(buf):
+        """returns keys_per_node and codec_id stored in a header"""
+        if bytes(buf[: len(HEADER_MAGIC)]) != HEADER_MAGIC:
+            raise Exception("no b+tree header")
+        buf = buf[-2 * CONFIG_SIZE :]
+        return from_bytes(buf[:CONFIG_SIZE]), from_bytes(buf[CONFIG_SIZE:])
+
+    def header_from_bytes(self, buf):
+        if bytes(buf[: len(HEADER_MAGIC)]) != HEADER_MAGIC:
+            raise Exception("no b+tree header")
+        _, buf = self.from_bytes(buf[len(HEADER_MAGIC) :])
+        b, buf = self._split(buf, COUNT_SIZE)
+        self.count = from_bytes(b)
+        b, buf = self._split(buf, self.link_size)
+        self._bloom_pos = from_bytes(b)
+        b, buf = self._split(buf, 1)
+        self._bloom_current = from_bytes(b) > 0
+        return self
+
+    @property
+    def bloom_pos(self):
+        return self.bloom_node.pos if self.bloom_node != None else 0
+
+    @property
+    def header_pos(self):
+        return self.header_node.pos if self.header_node != None else 0
+
+    def write_header(self):
+        if self.header_node == None:
+            raise Exception("no header")
+        if self.write_back != None:
+            # written with the next checkpoint, after the elements
+            self.write_back.header = True
+            self._header_buf = self.header_to_bytes()
+            return
+        self._write_header_disk()
+
+    def _write_header_disk(self):
+        buf = self.header_to_bytes()
+        write_page(self.btcore.heap_fd, self.header_node, buf)
+        self._header_buf = buf
+        self._header_disk = buf
+
+    def _write_bloom_not_current(self):
+        """before elements are written with the filter changed since the
+        header marked it current: the header on disk is written again with
+        the mark cleared, a crash meanwhile then rebuilds the filter on open"""
+        buf = self._header_disk
+        if buf == None or self.bloom == None or self.bloom.dirty == False:
+            return
+        i = len(buf) - 2 * CONFIG_SIZE - 1
+        if buf[i] == 0:
+            return
+        buf = buf[:i] + bytes([0]) + buf[i + 1 :]
+        write_page(self.btcore.heap_fd, self.header_node, buf)
+        self._header_disk = buf
+
+    def _header_state(self):
+        return self.root_pos, self.first_pos, self.last_pos, self.count
+
+    def _restore_header_state(self, state):
+        self.root_pos, self.first_pos, self.last_pos, self.count = state
+
+    def _write_header_changed(self):
+        self._rebuild_bloom_stale()
+        if self._pin_levels > 0 and self._pin_root != self.root_pos:
+            # the tree grew or shrank by one level
+            self.pin_levels(self._pin_levels)
+        if self.header_node == None:
+            return
+        if self.header_to_bytes() != self._header_buf:
+            self.write_header()
+
+    # lifecycle
+
+    @staticmethod
+    def create(
+        path,
+        keys_per_node=KEYS_PER_NODE,
+        conv_key=None,
+        conv_data=None,
+        codec=None,
+    ):
+        """create a new heap file with an empty tree.
+        the header is the first node in the heap, see header_pos"""
+        hpf = HeapFile(path).create()
+        hpf.close()
+
+        hpf = HeapFile(path).open()
+        bpt = BPlusTree.create_in(
+            hpf,
+            keys_per_node=keys_per_node,
+            conv_key=conv_key,
+            conv_data=conv_data,
+            codec=codec,
+        )
+        bpt.path = path
+        bpt._flush()
+        return bpt
+
+    @staticmethod
+    def create_in(
+        heap_fd,
+        keys_per_node=KEYS_PER_NODE,
+        conv_key=None,
+        conv_data=None,
+        codec=None,
+        cache=None,
+    ):
+        """create a new tree with header in an opened heap file"""
+        header_node = alloc_page(heap_fd, HEADER_SIZE)
+
+        btcore = BTreeCoreFile(heap_fd, keys_per_node=keys_per_node)
+        bpt = BPlusTree(
+            btcore, conv_key=conv_key, conv_data=conv_data, codec=codec, cache=cache
+        )
+        bpt.header_node = header_node
+        bpt.create_new()
+        bpt.write_header()
+        return bpt
+
+    @staticmethod
+    def open(
+        path, header_pos, conv_key=None, conv_data=None, codec=None, pin_levels=0
+    ):
+        """open an existing tree from its header, nothing else is read
+        except the pin_levels upper levels, see pin_levels().
+        if no codec is given the codec stored in the header is used"""
+        hpf = HeapFile(path).open()
+        bpt = BPlusTree.open_in(
+            hpf,
+            header_pos,
+            conv_key=conv_key,
+            conv_data=conv_data,
+            codec=codec,
+            pin_levels=pin_levels,
+        )
+        bpt.path = path
+        return bpt
+
+    @staticmethod
+    def open_in(
+        heap_fd,
+        header_pos,
+        conv_key=None,
+        conv_data=None,
+        codec=None,
+        cache=None,
+        pin_levels=0,
+    ):
+        """open a tree from its header in an opened heap file"""
+        header_node, buf = read_page(heap_fd, header_pos)
+
+        keys_per_node, codec_id = BPlusTree._header_config(buf)
+        if codec == None and codec_id > 0:
+            codec = get_codec(codec_id)
+
+        btcore = BTreeCoreFile(heap_fd, keys_per_node=keys_per_node)
+        bpt = BPlusTree(
+            btcore, conv_key=conv_key, conv_data=conv_data, codec=codec, cache=cache
+        )
+        bpt.header_node = header_node
+        bpt.header_from_bytes(buf)
+        bpt._header_buf = bytes(buf)
+        bpt._header_disk = bytes(buf)
+        if bpt._bloom_pos > 0:
+            bpt._read_bloom()
+        if pin_levels > 0:
+            bpt.pin_levels(pin_levels)
+        return bpt
+
+    def close(self):
+        self._write_bloom_changed()
+        self._write_header_changed()
+        if self.write_back != None:
+            self.write_back.checkpoint()
+        self._flush()
+        if self.durability == DURABILITY_FSYNC:
+            fsync_path(self.path)
+        if self.group_commit != None:
+            self.group_commit.stop()
+            self.group_commit = None
+        self.btcore.heap_fd.close()
+
+    # durability, see durability.py
+
+    def set_durability(
+        self, mode, interval_ms=GROUP_INTERVAL_MS, max_commits=GROUP_COMMITS
+    ):
+        """what to do when a context is done, see the DURABILITY_ modes.
+        for DURABILITY_GROUP interval_ms and max_commits limit the time
+        and the number of commits until the background fsync"""
+        if mode in [DURABILITY_FSYNC, DURABILITY_GROUP] and self.path == None:
+            raise Exception("path of heap file required for fsync")
+        if self.group_commit != None:
+            self.group_commit.stop()
+            self.group_commit = None
+        self.durability = mode
+        if mode == DURABILITY_GROUP:
+            self.group_commit = GroupCommit(
+                self.path, interval_ms=interval_ms, max_commits=max_commits
+            )
+
+    def _committed(self):
+        if self._checkpoint_due() == False:
+            return
+        self._apply_durability()
+
+    def _apply_durability(self):
+        if self.durability == DURABILITY_NONE:
+            return
+        self._flush()
+        if self.durability == DURABILITY_FSYNC:
+            fsync_path(self.path)
+        elif self.durability == DURABILITY_GROUP:
+            self.group_commit.commit()
+
+    # write back, see writeback.py
+
+    def enable_write_back(
+        self, max_elems=WRITE_BACK_ELEMS, interval_ms=WRITE_BACK_INTERVAL_MS
+    ):
+        """keep dirty elements in memory across contexts, and write them
+        at a checkpoint after max_elems are dirty or interval_ms passed.
+        the durability mode then applies to checkpoints.
+        changes since the last checkpoint are lost on a crash"""
+        self.disable_write_back()
+        self.write_back = WriteBack(self, max_elems=max_elems, interval_ms=interval_ms)
+
+    def disable_write_back(self):
+        if self.write_back != None:
+            self.write_back.checkpoint()
+            self.write_back = None
+
+    def _checkpoint_due(self):
+        """checkpoint if due, returns False if the changes stay in memory"""
+        if self.write_back == None:
+            return True
+        if self.write_back.due() == False:
+            return False
+        self.write_back.checkpoint()
+        return True
+
+    def checkpoint(self):
+        """write all changes held in memory, then flush"""
+        if self.write_back != None:
+            self.write_back.checkpoint()
+        self._flush()
+
+    def sync(self):
+        """flush and fsync now, regardless of the durability mode"""
+        self._flush()
+        if self.path != None:
+            fsync_path(self.path)
+
     # create methods
 
     def create_new(self):
@@ -141,6 +603,35 @@ class BPlusTree(object):
         self.root_pos = root.elem.pos
         return root
 
+    def bulk_load(self, items, fill=BULK_FILL):
+        """build the empty tree bottom up from (key, data) pairs sorted by key.
+        elements are filled up to fill of keys_per_node, see bulk.py.
+        returns the number of nodes loaded"""
+        if self.count > 0 or len(self._read_elem(self.root_pos).nodelist) > 0:
+            raise Exception("tree not empty")
+
+        loader = BulkLoader(self, fill=fill)
+        for key, data in items:
+            loader.add(key, data)
+            self._bloom_add(key)
+        res = loader.finish()
+        if res == None:
+            return 0
+
+        self._free_elem(self._read_elem(self.root_pos))
+        self.root_pos, self.first_pos, self.last_pos = res
+        self.count = loader.count
+        self._write_header_changed()
+        return loader.count
+
+    def dump(self, fd):
+        """write all nodes in key order to the binary file fd, see dump.py"""
+        return _dump.dump(self, fd)
+
+    def load(self, fd, fill=BULK_FILL):
+        """build the empty tree from a dump written by dump(), see dump.py"""
+        return _dump.load(self, fd, fill=fill)
+
     def _create_new_root_ctx(self, ctx):
         root = ctx.create_empty_list()
         self.root_pos = root.elem.pos
@@ -149,15 +640,139 @@ class BPlusTree(object):
     # basic io
 
     def _read_elem(self, pos):
+        write_back = self.write_back
+        if write_back != None and pos in write_back:
+            btelem = write_back.get(pos)
+            if btelem != None:
+                return btelem
+            # only the links changed
+            btelem = self._read_elem_disk(pos)
+            node, elem = write_back.get_links(pos)
+            btelem.elem.prev = elem.prev
+            btelem.elem.succ = elem.succ
+            return btelem
+        return self._read_elem_disk(pos)
+
+    def _read_elem_disk(self, pos):
+        if self.codec != None:
+            heap_node, dll_elem = self.btcore.fd.read_elem(pos)
+            buf = dll_elem.data
+            if is_paged(buf):
+                page_pos, size = read_stub(buf, self.link_size)
+                node, buf = read_page(self.btcore.heap_fd, page_pos)
+            if is_packed(buf):
+                nodelist = unpack_nodes(
+                    buf,
+                    self.link_size,
+                    conv_key=self.conv_key,
+                    conv_data=self.conv_data,
+                    codec=self.codec,
+                )
+                return BTreeElement(heap_node, dll_elem, nodelist)
+            # not yet written with the codec, e.g. a new empty element
         return self.btcore.read_list(
             pos, conv_key=self.conv_key, conv_data=self.conv_data
         )
 
+    def _is_leaf(self, btelem):
+        return len(btelem.nodelist) == 0 or btelem.nodelist[0].leaf == True
+
+    def leaf_version(self, pos):
+        """changes when the element at pos is written or freed"""
+        return self._versions.get(pos, 0)
+
+    def _bump_version(self, pos):
+        self._versions[pos] = self._versions.get(pos, 0) + 1
+
     def _write_elem(self, btelem):
+        self._bump_version(btelem.elem.pos)
+        if self.cache != None:
+            self.cache.put(CompactElement.from_btelem(btelem))
+        if self._pin_levels > 0:
+            self._pin_written(btelem)
+        if self.write_back != None:
+            return self.write_back.put(btelem)
+        return self._write_elem_disk(btelem)
+
+    def _write_elem_disk(self, btelem):
+        self._write_bloom_not_current()
+        if self.codec != None:
+            leaf = self._is_leaf(btelem)
+            buf = pack_nodes(
+                btelem.nodelist,
+                leaf,
+                self.codec,
+                self.link_size,
+                conv_key=self.conv_key,
+                conv_data=self.conv_data,
+            )
+            heap_fd = self.btcore.heap_fd
+            data = btelem.elem.data
+            old = None
+            if leaf:
+                buf, old = self._write_page(data, buf)
+            elif is_paged(data):
+                # a leaf before, e.g. the root emptied meanwhile
+                old = heap_fd.read_node(read_stub(data, self.link_size)[0])
+            btelem.elem.data = buf
+            self.btcore.fd.write_elem(btelem.node, btelem.elem)
+            if old != None:
+                # after the stub pointing elsewhere is written
+                free_page(heap_fd, old)
+            return
         return self.btcore.write_list(
             btelem, conv_key=self.conv_key, conv_data=self.conv_data
         )
 
+    def _write_page(self, data, buf):
+        """write the compressed nodes of a leaf to a page sized to them,
+        data is the element data on disk. returns the stub to write and
+        the page node to free then, or None"""
+        heap_fd = self.btcore.heap_fd
+        size = page_size(len(buf))
+        if is_paged(data):
+            page_pos, old_size = read_stub(data, self.link_size)
+            node = heap_fd.read_node(page_pos)
+            if len(buf) <= old_size and old_size <= size * 2:
+                write_page(heap_fd, node, buf)
+                return data, None
+        else:
+            node = None
+        new_node = alloc_page(heap_fd, size, buf)
+        return page_stub(new_node.pos, size, self.link_size), node
+
+    def _read_dll_elem(self, pos):
+        if self.write_back != None and pos in self.write_back:
+            return self.write_back.get_links(pos)
+        return self.btcore.fd.read_elem(pos)
+
+    def _write_dll_elem(self, heap_node, dll_elem):
+        """write the links of an element, the node list is not encoded again"""
+        self._bump_version(dll_elem.pos)
+        self._unpin(dll_elem.pos)
+        if self.cache != None:
+            self.cache.discard(dll_elem.pos)
+        if self.write_back != None:
+            return self.write_back.put_links(heap_node, dll_elem)
+        return self.btcore.fd.write_elem(heap_node, dll_elem)
+
+    def _free_elem(self, btelem):
+        self._bump_version(btelem.elem.pos)
+        self._unpin(btelem.elem.pos)
+        if self.cache != None:
+            self.cache.discard(btelem.elem.pos)
+        if self.write_back != None:
+            return self.write_back.free(btelem)
+        self._free_elem_disk(btelem.node, btelem.elem.data)
+
+    def _free_elem_disk(self, heap_node, data):
+        """free an element and the page of a compressed leaf"""
+        heap_fd = self.btcore.heap_fd
+        if self.codec != None and is_paged(data):
+            page_pos, size = read_stub(data, self.link_size)
+            free_page(heap_fd, heap_fd.read_node(page_pos))
+        heap_fd.free(heap_node, merge_free=False)
+
     def _flush(self):
         self.btcore.heap_fd.flush()
 
@@ -167,6 +782,9 @@ class BPlusTree(object):
         pos = self.first_pos
         if pos == 0:
             raise Exception("not initialized")
+        yield from self._iter_elem_succ(pos)
+
+    def _iter_elem_succ(self, pos):
         while pos > 0:
             btelem = self._read_elem(pos)
             yield btelem
@@ -191,10 +809,224 @@ class BPlusTree(object):
             for n in reversed(btelem.nodelist):
                 yield n
 
+    def iter_range(self, lower=None, upper=None, ctx=None):
+        """iterate the nodes with lower < key <= upper, None for an open range"""
+        if ctx == None:
+            ctx = Context(self)
+        pos = self.root_pos
+        page = ctx._read_compact(pos)
+        while page.leaf == False:
+            pos = page.child_pos(lower) if lower != None else page.lefts[0]
+            if pos == 0:
+                return
+            page = ctx._read_compact(pos)
+        for btelem in self._iter_elem_succ(pos):
+            for n in btelem.nodelist:
+                if lower != None and n.key <= lower:
+                    continue
+                if upper != None and n.key > upper:
+                    return
+                yield n
+
+    def parallel_scan(self, func, workers=None, ordered=True, path=None):
+        """call func in separate processes, each with an iterator over one
+        key range of the tree. returns the results of func, in key order
+        if ordered is set, see parallel.py"""
+        from .parallel import parallel_scan
+
+        return parallel_scan(self, func, workers=workers, ordered=ordered, path=path)
+
+    def cursor(self):
+        """a `Cursor` that keeps its position between calls, see cursor.py"""
+        from .cursor import Cursor
+
+        return Cursor(self)
+
+    # set operations, see setops.py
+
+    def merge_join(self, other):
+        """pairs of nodes with the same key in this and the other tree"""
+        from .setops import merge_join
+
+        return merge_join(self, other)
+
+    def intersect(self, other):
+        from .setops import intersect
+
+        return intersect(self, other)
+
+    def difference(self, other):
+        from .setops import difference
+
+        return difference(self, other)
+
+    def union(self, other):
+        from .setops import union
+
+        return union(self, other)
+
+    # bloom filter, see bloom.py
+
+    def enable_bloom(self, fp_rate=BLOOM_FP_RATE, max_bytes=None, capacity=None):
+        """keep a bloom filter over the keys, built from the keys in the tree.
+        contains() and get_many() answer most misses without descent.
+        the filter is written with close(), see also write_bloom()"""
+        if capacity == None:
+            capacity = self.count * 2
+        self.bloom = BloomFilter(capacity, fp_rate=fp_rate, max_bytes=max_bytes)
+        self._fill_bloom()
+        self._write_header_changed()
+
+    def disable_bloom(self):
+        if self.bloom_node != None:
+            free_page(self.btcore.heap_fd, self.bloom_node)
+            self.bloom_node = None
+        self.bloom = None
+        self._write_header_changed()
+
+    def write_bloom(self):
+        """write the filter, and the header marking it as current"""
+        self._write_bloom_changed()
+        self._write_header_changed()
+
+    def _bloom_key(self, key):
+        return self.conv_key.encode(key) if self.conv_key else bytes(key)
+
+    def _bloom_add(self, key):
+        if self.bloom != None:
+            self.bloom.add(self._bloom_key(key))
+
+    def _bloom_remove(self):
+        if self.bloom != None:
+            self.bloom.remove()
+
+    def _may_contain(self, key):
+        return self.bloom == None or self._bloom_key(key) in self.bloom
+
+    def _fill_bloom(self):
+        """add the keys in the tree, the count may be unknown, e.g. after
+        from_bytes(). a filter too small is renewed for the keys found"""
+        for n in self.iter_first():
+            self.bloom.add(self._bloom_key(n.key))
+        if self.bloom.added > self.bloom.capacity:
+            self.bloom = self.bloom.renew(self.bloom.added)
+            self._fill_bloom()
+
+    def _rebuild_bloom_stale(self):
+        # only called when all changes are written, the scan sees all keys
+        if self.bloom != None and self.bloom.stale():
+            self.bloom = self.bloom.renew(self.bloom.keys())
+            self._fill_bloom()
+
+    def _read_bloom(self):
+        self.bloom_node, buf = read_page(self.btcore.heap_fd, self._bloom_pos)
+        self._bloom_size = len(buf)
+        self.bloom = BloomFilter.from_bytes(buf)
+        if self._bloom_current == False:
+            # changes after the filter was written are unknown
+            self.bloom = self.bloom.renew(self.count)
+            self._fill_bloom()
+
+    def _write_bloom_changed(self):
+        if self.header_node == None or self.bloom == None:
+            return
+        if self.bloom.dirty == False:
+            return
+        heap_fd = self.btcore.heap_fd
+        buf = self.bloom.to_bytes()
+        if self.bloom_node != None and len(buf) > self._bloom_size:
+            free_page(heap_fd, self.bloom_node)
+            self.bloom_node = None
+        if self.bloom_node == None:
+            self.bloom_node = alloc_page(heap_fd, len(buf))
+            self._bloom_size = len(buf)
+        write_page(heap_fd, self.bloom_node, buf)
+        self.bloom.dirty = False
+
+    # pinned upper levels
+
+    def pin_levels(self, levels):
+        """keep the inner elements of the upper levels in memory,
+        the root is level 0. writes through a `Context` keep them current.
+        0 releases all pinned elements"""
+        self.pinned = {}
+        self._pin_level = {}
+        self._pin_levels = levels
+        self._pin_root = self.root_pos
+        if levels == 0 or self.root_pos == 0:
+            return
+        todo = [(self.root_pos, 0)]
+        while len(todo) > 0:
+            pos, level = todo.pop()
+            page = CompactElement.from_btelem(self._read_elem(pos))
+            if page.leaf == True:
+                continue
+            self._pin(page, level)
+            if level + 1 < levels:
+                todo.extend(map(lambda x: (x, level + 1), page.children()))
+
+    def _pin(self, page, level):
+        self.pinned[page.pos] = page
+        self._pin_level[page.pos] = level
+
+    def _unpin(self, pos):
+        self.pinned.pop(pos, None)
+        self._pin_level.pop(pos, None)
+
+    def _pin_written(self, btelem):
+        pos = btelem.elem.pos
+        if self._is_leaf(btelem):
+            self._unpin(pos)
+            return
+        level = self._pin_level.get(pos)
+        if level == None:
+            # new element below a pinned one, e.g. after a split
+            parent = self._pin_level.get(btelem.nodelist.parent)
+            if parent == None or parent + 1 >= self._pin_levels:
+                return
+            level = parent + 1
+        self._pin(CompactElement.from_btelem(btelem), level)
+
+    # adaptive hash index, see hashindex.py
+
+    def enable_hash_index(self, max_keys=HASH_KEYS, hot=HASH_HOT):
+        """map keys searched hot times straight to their leaf"""
+        self.hash_index = AdaptiveHashIndex(self, max_keys=max_keys, hot=hot)
+        return self.hash_index
+
+    def disable_hash_index(self):
+        self.hash_index = None
+
+    def _hash_invalidate(self, pos):
+        if self.hash_index != None:
+            self.hash_index.invalidate_leaf(pos)
+
     # search
 
+    def contains(self, key, ctx=None):
+        """existence check of key, misses are mostly answered by the bloom filter"""
+        if self._may_contain(key) == False:
+            return False
+        n, btelem, rc, ctx = self.search_node(key, ctx=ctx)
+        return rc
+
+    def _hash_lookup(self, key, ctx):
+        """search key in the leaf given by the adaptive hash index.
+        returns node and element, or None to descend from the root"""
+        pos = self.hash_index.lookup(key)
+        if pos == None:
+            return None
+        btelem = ctx._read_elem(pos)
+        idx = btelem.nodelist.find_key(key)
+        if idx < 0:
+            # moved by changes in ctx not written yet
+            return None
+        ctx.path.append(pos)
+        return btelem.nodelist[idx], btelem
+
     def search_node(self, key, npos=None, ctx=None):
         """search a key, or if missing return the node element to insert into"""
+        hashed = npos == None and self.hash_index != None
         if npos == None:
             if self.root_pos == 0:
                 raise Exception("not initialized")
@@ -203,27 +1035,85 @@ class BPlusTree(object):
         if ctx == None:
             ctx = Context(self)
 
-        btelem = ctx._read_elem(npos)
-
-        if len(btelem.nodelist) == 0:
-            if btelem.elem.pos != self.root_pos:
-                raise Exception("wrong root")
-            # root node handling for less existing elements
-            return None, btelem, False, ctx
-
-        for n in btelem.nodelist:
-            if n.leaf == True:
-                if n.key == key:
-                    return n, btelem, True, ctx
-                continue
-            if key <= n.key:
-                return self.search_node(key, n.left)
+        ctx._begin_path()
+
+        if hashed == True:
+            found = self._hash_lookup(key, ctx)
+            if found != None:
+                return found[0], found[1], True, ctx
+
+        while True:
+            page = ctx._read_path(npos)
+
+            if len(page) == 0:
+                if page.pos != self.root_pos:
+                    raise Exception("wrong root")
+                # root node handling for less existing elements
+                return None, ctx._read_elem(npos), False, ctx
+
+            if page.leaf == True:
+                btelem = ctx._read_elem(npos)
+                idx = page.find_key(key)
+                if idx >= 0:
+                    if hashed == True:
+                        self.hash_index.note(key, npos)
+                    return btelem.nodelist[idx], btelem, True, ctx
+                return None, btelem, False, ctx
+
+            rpos = page.child_pos(key)
+            if rpos == 0:
+                return None, ctx._read_elem(npos), False, ctx
+
+            npos = rpos
+
+    def get_many(self, keys, ctx=None):
+        """search several keys by walking the tree once.
+        returns the nodes in the order of keys, or None for a missing key"""
+        if self.root_pos == 0:
+            raise Exception("not initialized")
 
-        rpos = btelem.nodelist[-1].right
-        if rpos == 0:
-            return None, btelem, False, ctx
+        if ctx == None:
+            ctx = Context(self)
 
-        return self.search_node(key, rpos)
+        found = {}
+        skeys = sorted(filter(self._may_contain, set(keys)))
+        if len(skeys) > 0:
+            self._get_many_ctx(skeys, self.root_pos, found, ctx)
+
+        return [found.get(key) for key in keys]
+
+    def _get_many_ctx(self, keys, npos, found, ctx):
+        page = ctx._read_compact(npos)
+
+        if page.leaf == True:
+            for key in keys:
+                idx = page.find_key(key)
+                if idx >= 0:
+                    found[key] = page.node(idx)
+            return
+
+        # split the sorted keys into runs sharing the same child element
+        i = 0
+        while i < len(keys):
+            idx = bisect_left(page.keys, keys[i])
+            if idx < len(page):
+                cpos = page.lefts[idx]
+                j = bisect_right(keys, page.keys[idx], i + 1)
+            else:
+                cpos = page.rights[-1]
+                j = len(keys)
+            if cpos > 0:
+                self._get_many_ctx(keys[i:j], cpos, found, ctx)
+            i = j
+
+    # integrity
+
+    def verify(self, sample=None, budget=None, verifier=None):
+        """check the tree structure, see `Verifier`.
+        returns the verifier, pass it again to resume an unfinished check"""
+        if verifier == None:
+            verifier = Verifier(self, sample=sample)
+        return verifier.run(budget=budget)
 
     # insert methods
 
@@ -237,6 +1127,7 @@ class BPlusTree(object):
         return self.btcore.keys_per_node // 2
 
     def _split_elem_ctx(self, btelem, ctx):
+        self._hash_invalidate(btelem.elem.pos)
         left = ctx.create_empty_list()
         ctx.add(left)
         # re-name just for better understanding
@@ -269,6 +1160,8 @@ class BPlusTree(object):
             raise Exception("insert in inner node")
 
         btelem.nodelist.insert(n)
+        self.count += 1
+        self._bloom_add(n.key)
 
         if self._no_split_required(btelem) == True:
             ctx._write_elem(btelem)
@@ -363,6 +1256,88 @@ class BPlusTree(object):
 
         return n
 
+    # upsert methods
+
+    def _upsert(self, key, func, ctx=None, ctx_close=True):
+        """locate the leaf once and call func with the existing node, or None.
+        func returns (change, data). the node is then updated in place,
+        or inserted if missing. only the affected leaf is marked dirty."""
+        n, btelem, rc, ctx = self.search_node(key, ctx=ctx)
+
+        if rc == False:
+            n = None
+
+        change, data = func(n)
+
+        if change == True:
+            if n != None:
+                if n.data != data:
+                    self._release_data(n.data, ctx)
+                n.data = data
+                ctx._write_elem(btelem)
+            else:
+                n = Node(key=key, data=data)
+                self.insert_2_leaf_ctx(n, btelem, ctx)
+
+        if ctx_close == True:
+            ctx.done()
+
+        return n, change
+
+    def put(self, key, data, ctx=None, ctx_close=True):
+        """insert, or update the data of an existing key"""
+        n, _ = self._upsert(key, lambda n: (True, data), ctx=ctx, ctx_close=ctx_close)
+        return n
+
+    def setdefault(self, key, data, ctx=None, ctx_close=True):
+        """insert only if key is missing. returns the data stored for key"""
+        n, _ = self._upsert(
+            key, lambda n: (n == None, data), ctx=ctx, ctx_close=ctx_close
+        )
+        return n.data
+
+    def update_if(self, key, expected, data, ctx=None, ctx_close=True):
+        """compare-and-set. update only if key exists and holds expected data"""
+
+        def _cas(n):
+            return n != None and n.data == expected, data
+
+        _, change = self._upsert(key, _cas, ctx=ctx, ctx_close=ctx_close)
+        return change
+
+    def increment(self, key, delta=1, ctx=None, ctx_close=True):
+        """add delta to the data of key, a missing key starts with 0"""
+
+        def _inc(n):
+            return True, (n.data if n != None else 0) + delta
+
+        n, _ = self._upsert(key, _inc, ctx=ctx, ctx_close=ctx_close)
+        return n.data
+
+    def write_batch(self, items, ctx=None, ctx_close=True):
+        """put (key, data) items in key order within one context,
+        data TOMBSTONE deletes the key. consecutive keys of a leaf
+        then change the same element in the context, which is written
+        once on done. returns the number of keys changed"""
+        if ctx == None:
+            ctx = Context(self)
+
+        changed = 0
+        for key, data in sorted(items, key=lambda x: x[0]):
+            if data is TOMBSTONE:
+                n, btelem, rc, ctx = self.search_node(key, ctx=ctx)
+                if rc == True:
+                    self.delete_from_leaf(key, btelem, ctx=ctx, ctx_close=False)
+                    changed += 1
+                continue
+            self.put(key, data, ctx=ctx, ctx_close=False)
+            changed += 1
+
+        if ctx_close == True:
+            ctx.done()
+
+        return changed
+
     # common
 
     def _update_childs_ctx(self, btelem, ctx):
@@ -420,8 +1395,25 @@ class BPlusTree(object):
         right = ctx._read_elem(right_pos) if right_pos > 0 else None
         return left, right
 
+    def _release_data(self, data, ctx):
+        """data of a replaced or deleted key is released by the data
+        converter when the context is done, see ConvertOverflow.release()"""
+        if hasattr(self.conv_data, "release"):
+            ctx.on_done(lambda: self.conv_data.release(data))
+
     def delete_from_leaf(self, key, btelem, ctx=None, ctx_close=True):
-        ctx = self._delete_from_ctx(key, btelem, ctx=ctx, ctx_close=ctx_close)
+        if ctx == None:
+            ctx = Context(self)
+        idx = btelem.nodelist.find_key(key)
+        if idx >= 0:
+            self._release_data(btelem.nodelist[idx].data, ctx)
+        ctx = self._delete_from_ctx(key, btelem, ctx=ctx, ctx_close=False)
+        if idx >= 0:
+            # removed, counted before the context writes the header
+            self.count -= 1
+            self._bloom_remove()
+        if ctx_close == True:
+            ctx.done()
         return ctx
 
     def _delete_rebalance_ctx(self, btelem, ctx):
@@ -562,6 +1554,8 @@ class BPlusTree(object):
 
     def _merge_siblings_ctx(self, left, right, ctx):
         """merge left to right, drop left in parent"""
+        self._hash_invalidate(left.elem.pos)
+        self._hash_invalidate(right.elem.pos)
         prev_node = None
         if left.elem.prev > 0:
             prev_node, prev_elem = ctx._read_dll_elem(left.elem.prev)
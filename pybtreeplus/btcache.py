@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+CACHE_ELEMS = 0x400
+
+
+class ElementCache(object):
+    """lru cache of elements in compact form.
+    entries are keyed by element position, so one cache can be shared
+    by all trees living in the same heap file."""
+
+    def __init__(self, max_elems=CACHE_ELEMS):
+        self.max_elems = max_elems
+        self.elems = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.elems)
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( elems: "
+            + str(len(self.elems))
+            + " hits: "
+            + str(self.hits)
+            + " misses: "
+            + str(self.misses)
+            + " )"
+        )
+
+    def get(self, pos):
+        page = self.elems.get(pos)
+        if page == None:
+            self.misses += 1
+            return None
+        self.elems.move_to_end(pos)
+        self.hits += 1
+        return page
+
+    def put(self, page):
+        self.elems[page.pos] = page
+        self.elems.move_to_end(page.pos)
+        while len(self.elems) > self.max_elems:
+            self.elems.popitem(last=False)
+
+    def discard(self, pos):
+        self.elems.pop(pos, None)
+
+    def clear(self):
+        self.elems.clear()
@@ -0,0 +1,112 @@
+from bisect import bisect_left
+
+from pybtreecore.btnodelist import Node
+
+
+class CompactElement(object):
+    """compact in-memory form of a tree element.
+    keys, data and child pointers are held in parallel lists,
+    `Node` objects are only created on demand."""
+
+    __slots__ = (
+        "pos",
+        "prev",
+        "succ",
+        "parent",
+        "leaf",
+        "keys",
+        "data",
+        "lefts",
+        "rights",
+    )
+
+    def __init__(self, pos=0, prev=0, succ=0, parent=0, leaf=True):
+        self.pos = pos
+        self.prev = prev
+        self.succ = succ
+        self.parent = parent
+        self.leaf = leaf
+        self.keys = []
+        # leaf elements only
+        self.data = None
+        # inner elements only
+        self.lefts = None
+        self.rights = None
+
+    @staticmethod
+    def from_btelem(btelem):
+        nodelist = btelem.nodelist
+        leaf = len(nodelist) == 0 or nodelist[0].leaf == True
+        page = CompactElement(
+            pos=btelem.elem.pos,
+            prev=btelem.elem.prev,
+            succ=btelem.elem.succ,
+            parent=nodelist.parent,
+            leaf=leaf,
+        )
+        page.keys = [n.key for n in nodelist]
+        if leaf == True:
+            page.data = [n.data for n in nodelist]
+        else:
+            page.lefts = [n.left for n in nodelist]
+            page.rights = [n.right for n in nodelist]
+        return page
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( pos: "
+            + hex(self.pos)
+            + " parent: "
+            + hex(self.parent)
+            + " leaf: "
+            + str(self.leaf)
+            + " keys: "
+            + str(len(self.keys))
+            + " )"
+        )
+
+    def node(self, idx):
+        """materialise the `Node` at idx"""
+        if self.leaf == True:
+            return Node(key=self.keys[idx], data=self.data[idx])
+        return Node(key=self.keys[idx], left=self.lefts[idx], right=self.rights[idx])
+
+    def nodes(self):
+        for idx in range(0, len(self.keys)):
+            yield self.node(idx)
+
+    def find_key(self, key):
+        """index of key in a leaf element, or -1 if missing"""
+        idx = bisect_left(self.keys, key)
+        if idx < len(self.keys) and self.keys[idx] == key:
+            return idx
+        return -1
+
+    def child_pos(self, key):
+        """position of the child element to descend into for key.
+        returns 0 if there is no such child."""
+        idx = bisect_left(self.keys, key)
+        if idx < len(self.keys):
+            return self.lefts[idx]
+        return self.rights[-1]
+
+    def children(self):
+        """positions of all child elements in key order"""
+        return list(map(lambda x: x[0], self.child_ranges()))
+
+    def child_ranges(self, lower=None, upper=None):
+        """child elements with their key range as (pos, lower, upper).
+        keys in a child are greater than lower, and less or equal upper.
+        None stands for an open range."""
+        childs = []
+        for key, left in zip(self.keys, self.lefts):
+            childs.append((left, lower, key))
+            lower = key
+        right = self.rights[-1] if len(self.rights) > 0 else 0
+        if right > 0:
+            childs.append((right, lower, upper))
+        return childs
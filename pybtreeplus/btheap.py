@@ -0,0 +1,29 @@
+from pyheapfile.heap import to_bytes, from_bytes
+
+# payload length prefix of a raw heap page
+PAGE_LEN_SIZE = 4
+
+
+def alloc_page(heap_fd, size, buf=None):
+    """allocate a raw heap page with room for size payload bytes.
+    the page is written only if buf is given."""
+    node = heap_fd.alloc(size + PAGE_LEN_SIZE)
+    if buf != None:
+        write_page(heap_fd, node, buf)
+    return node
+
+
+def read_page(heap_fd, pos):
+    """read a raw heap page, returns the heap node and the payload"""
+    node = heap_fd.read_node(pos)
+    buf = node.data
+    size = from_bytes(buf[:PAGE_LEN_SIZE])
+    return node, bytes(buf[PAGE_LEN_SIZE : PAGE_LEN_SIZE + size])
+
+
+def write_page(heap_fd, node, buf):
+    heap_fd.write_node(node, bytes(to_bytes(len(buf), PAGE_LEN_SIZE)) + bytes(buf))
+
+
+def free_page(heap_fd, node):
+    heap_fd.free(node, merge_free=False)
@@ -0,0 +1,144 @@
+from pybtreecore.btnodelist import Node
+
+# fraction of keys_per_node used in every element
+BULK_FILL = 0.9
+
+
+class _Level(object):
+    def __init__(self):
+        # element taking the next nodes
+        self.cur = None
+        # last completed element
+        self.prev = None
+        # rightmost element after finish
+        self.last = None
+
+
+class BulkLoader(object):
+    """builds a tree bottom up from (key, data) pairs sorted by key.
+
+    only the open and the last completed element of every level are
+    held in memory. a leaf is written as soon as its successor is known,
+    an inner element as soon as it is filled. finish() links the right
+    edge of the tree and returns the root, first and last position."""
+
+    def __init__(self, bpt, fill=BULK_FILL):
+        self.bpt = bpt
+        kpn = bpt.btcore.keys_per_node
+        self.fill = max(2, min(kpn - 1, int(kpn * fill)))
+        self.levels = [_Level()]
+        self.first_pos = 0
+        self.last_key = None
+        self.count = 0
+
+    def _create(self):
+        return self.bpt.btcore.create_empty_list()
+
+    def _write(self, btelem):
+        self.bpt._write_elem(btelem)
+
+    def add(self, key, data):
+        if self.count > 0 and not key > self.last_key:
+            raise Exception("wrong order", key, self.last_key)
+        self.last_key = key
+
+        level = self.levels[0]
+        if level.cur == None:
+            level.cur = self._create()
+            if level.prev != None:
+                level.prev.elem.succ = level.cur.elem.pos
+                level.cur.elem.prev = level.prev.elem.pos
+                self._write(level.prev)
+            else:
+                self.first_pos = level.cur.elem.pos
+
+        level.cur.nodelist.insert(Node(key=key, data=data))
+        self.count += 1
+
+        if len(level.cur.nodelist) >= self.fill:
+            # the leaf is written when the successor is created
+            self._complete(0, write=False)
+
+    def _complete(self, idx, write=True):
+        level = self.levels[idx]
+        btelem = level.cur
+        key = btelem.nodelist[-1].key
+        btelem.nodelist.parent = self._add_child(idx + 1, key, btelem.elem.pos)
+        if write == True:
+            self._write(btelem)
+        level.prev = btelem
+        level.cur = None
+
+    def _add_child(self, idx, key, pos):
+        """add a child to the open element on level idx.
+        returns the position of the element taking the child."""
+        if idx == len(self.levels):
+            self.levels.append(_Level())
+        level = self.levels[idx]
+        if level.cur == None:
+            level.cur = self._create()
+        level.cur.nodelist.insert(Node(key=key, left=pos))
+        holder = level.cur.elem.pos
+        if len(level.cur.nodelist) >= self.fill:
+            self._complete(idx)
+        return holder
+
+    def _right_link(self, btelem):
+        """the rightmost child of an element is linked by the last node"""
+        n = btelem.nodelist.pop(-1)
+        btelem.nodelist[-1].set_right(n.left)
+
+    def _free(self, btelem):
+        self.bpt._free_elem(btelem)
+
+    def finish(self):
+        """returns root, first and last position, or None if empty"""
+        if self.count == 0:
+            return None
+        leafs = self.levels[0]
+        last = leafs.cur if leafs.cur != None else leafs.prev
+        root = self._close(0)
+        return root.elem.pos, self.first_pos, last.elem.pos
+
+    def _close(self, idx):
+        level = self.levels[idx]
+
+        if idx + 1 == len(self.levels):
+            # nothing was completed here, the only element becomes root
+            root = level.cur
+            if idx > 0 and len(root.nodelist) == 1:
+                child = self.levels[idx - 1].last
+                self._free(root)
+                root = child
+            elif idx > 0:
+                self._right_link(root)
+            root.nodelist.parent = 0
+            self._write(root)
+            return root
+
+        if level.cur == None:
+            # the last completed element is the rightmost
+            if idx > 0:
+                self._right_link(level.prev)
+            self._write(level.prev)
+            level.last = level.prev
+        elif idx > 0 and len(level.cur.nodelist) == 1:
+            # a single child moves to the right link of the previous element
+            child = self.levels[idx - 1].last
+            level.prev.nodelist[-1].set_right(child.elem.pos)
+            child.nodelist.parent = level.prev.elem.pos
+            self._write(child)
+            self._free(level.cur)
+            self._write(level.prev)
+            level.last = level.prev
+        else:
+            cur = level.cur
+            key = cur.nodelist[-1].key
+            if idx > 0:
+                self._right_link(cur)
+            cur.nodelist.parent = self._add_child(idx + 1, key, cur.elem.pos)
+            self._write(cur)
+            level.last = cur
+
+        level.cur = None
+        return self._close(idx + 1)
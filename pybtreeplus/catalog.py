@@ -0,0 +1,179 @@
+from pyheapfile.heap import HeapFile, to_bytes, from_bytes
+from pybtreecore.btcore import KEYS_PER_NODE
+
+from .bptree import BPlusTree
+from .btcache import ElementCache, CACHE_ELEMS
+from .btheap import alloc_page, read_page, write_page
+from .durability import DURABILITY_NONE, DURABILITY_RANK
+from .transaction import Transaction
+
+CATALOG_MAGIC = bytes([0xBF, 0x7E, 0xCA, 0x01])
+CATALOG_SIZE = 0x1000
+
+COUNT_SIZE = 4
+POS_SIZE = 8
+NAME_LEN_SIZE = 2
+
+
+class Catalog(object):
+    """named trees stored in one heap file.
+
+    all trees share the heap file, one `ElementCache`, and the heap
+    free list. `commit()` writes the changed tree headers and flushes
+    the heap file once for all trees."""
+
+    def __init__(self, heap_fd, cache_elems=CACHE_ELEMS, path=None):
+        self.heap_fd = heap_fd
+        self.path = path
+        self.cache = ElementCache(max_elems=cache_elems)
+
+        self.catalog_node = None
+        # name -> header position
+        self.headers = {}
+        # name -> opened BPlusTree
+        self.trees = {}
+
+    def __repr__(self):
+        return self.__class__.__name__ + "( " + str(self.names()) + " )"
+
+    @property
+    def catalog_pos(self):
+        return self.catalog_node.pos if self.catalog_node != None else 0
+
+    # persistence methods
+
+    def to_bytes(self):
+        buf = []
+        buf.extend(CATALOG_MAGIC)
+        buf.extend(to_bytes(len(self.headers), COUNT_SIZE))
+        for name, header_pos in self.headers.items():
+            bnam = name.encode()
+            buf.extend(to_bytes(len(bnam), NAME_LEN_SIZE))
+            buf.extend(bnam)
+            buf.extend(to_bytes(header_pos, POS_SIZE))
+        return bytes(buf)
+
+    def from_bytes(self, buf):
+        if bytes(buf[: len(CATALOG_MAGIC)]) != CATALOG_MAGIC:
+            raise Exception("no catalog")
+        buf = buf[len(CATALOG_MAGIC) :]
+        cnt = from_bytes(buf[:COUNT_SIZE])
+        buf = buf[COUNT_SIZE:]
+        self.headers = {}
+        for i in range(0, cnt):
+            nlen = from_bytes(buf[:NAME_LEN_SIZE])
+            name = bytes(buf[NAME_LEN_SIZE : NAME_LEN_SIZE + nlen]).decode()
+            buf = buf[NAME_LEN_SIZE + nlen :]
+            self.headers[name] = from_bytes(buf[:POS_SIZE])
+            buf = buf[POS_SIZE:]
+        return self
+
+    def _write_catalog(self):
+        buf = self.to_bytes()
+        if len(buf) > CATALOG_SIZE:
+            raise Exception("catalog full")
+        write_page(self.heap_fd, self.catalog_node, buf)
+
+    # lifecycle
+
+    @staticmethod
+    def create(path, cache_elems=CACHE_ELEMS):
+        """create a new heap file with an empty catalog as first node"""
+        hpf = HeapFile(path).create()
+        hpf.close()
+
+        hpf = HeapFile(path).open()
+        catalog = Catalog(hpf, cache_elems=cache_elems, path=path)
+        catalog.catalog_node = alloc_page(hpf, CATALOG_SIZE)
+        catalog._write_catalog()
+        hpf.flush()
+        return catalog
+
+    @staticmethod
+    def open(path, catalog_pos, cache_elems=CACHE_ELEMS):
+        hpf = HeapFile(path).open()
+        catalog = Catalog(hpf, cache_elems=cache_elems, path=path)
+        catalog.catalog_node, buf = read_page(hpf, catalog_pos)
+        catalog.from_bytes(buf)
+        return catalog
+
+    def commit(self):
+        """write the changed headers of all opened trees, then flush once.
+        the strictest durability mode of the trees applies to all"""
+        for bpt in self.trees.values():
+            bpt._write_header_changed()
+            if bpt.write_back != None:
+                bpt.write_back.checkpoint()
+        if len(self.trees) > 0:
+            bpt = max(self.trees.values(), key=lambda x: DURABILITY_RANK[x.durability])
+            if bpt.durability != DURABILITY_NONE:
+                bpt._apply_durability()
+                return
+        self.heap_fd.flush()
+
+    def close(self):
+        for bpt in self.trees.values():
+            bpt._write_bloom_changed()
+        self.commit()
+        for bpt in self.trees.values():
+            if bpt.group_commit != None:
+                bpt.group_commit.stop()
+                bpt.group_commit = None
+        self.trees = {}
+        self.heap_fd.close()
+
+    # trees
+
+    def names(self):
+        return list(self.headers.keys())
+
+    def __contains__(self, name):
+        return name in self.headers
+
+    def create_tree(
+        self,
+        name,
+        keys_per_node=KEYS_PER_NODE,
+        conv_key=None,
+        conv_data=None,
+        codec=None,
+    ):
+        if name in self.headers:
+            raise Exception("tree already exists", name)
+        bpt = BPlusTree.create_in(
+            self.heap_fd,
+            keys_per_node=keys_per_node,
+            conv_key=conv_key,
+            conv_data=conv_data,
+            codec=codec,
+            cache=self.cache,
+        )
+        bpt.path = self.path
+        self.headers[name] = bpt.header_pos
+        self.trees[name] = bpt
+        self._write_catalog()
+        return bpt
+
+    def tree(self, name, conv_key=None, conv_data=None, codec=None):
+        """returns the opened tree, converters are required on first access"""
+        if name in self.trees:
+            return self.trees[name]
+        if name not in self.headers:
+            raise Exception("tree not found", name)
+        bpt = BPlusTree.open_in(
+            self.heap_fd,
+            self.headers[name],
+            conv_key=conv_key,
+            conv_data=conv_data,
+            codec=codec,
+            cache=self.cache,
+        )
+        bpt.path = self.path
+        self.trees[name] = bpt
+        return bpt
+
+    def transaction(self, *names):
+        """transaction over the named trees, or over all opened trees"""
+        if len(names) == 0:
+            names = self.trees.keys()
+        return Transaction(*[self.trees[name] for name in names])
@@ -0,0 +1,182 @@
+import zlib
+import lzma
+
+from pyheapfile.heap import to_bytes, from_bytes
+from pybtreecore.btnodelist import Node, NodeList
+
+# marks an element written in compressed form
+CODEC_MAGIC = bytes([0xBC, 0x7A, 0x1E, 0xAF])
+# marks a leaf element holding a stub, its compressed nodes are in a page
+PAGE_MAGIC = bytes([0xBC, 0x7A, 0x1E, 0xB0])
+
+# kind of a packed element
+LEAF = 0
+INNER = 1
+
+COUNT_SIZE = 4
+ITEM_LEN_SIZE = 2
+# pages for compressed leafs are allocated in multiples of
+PAGE_ALIGN = 0x40
+
+
+class Codec(object):
+    """interface of a page compression codec.
+    codec_id is stored in every compressed page and must be unique.
+
+    the element of a leaf, linked from parent and neighbours, holds only a
+    stub pointing to a heap page sized to the compressed nodes, see
+    page_stub(). reading a leaf then reads the stub and the compressed
+    bytes instead of the whole element. inner elements are compressed in
+    place, they are read on every lookup and stay a single read."""
+
+    codec_id = 0
+
+    def compress(self, buf):
+        raise Exception("not implemented")
+
+    def decompress(self, buf):
+        raise Exception("not implemented")
+
+
+class ZlibCodec(Codec):
+
+    codec_id = 1
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, buf):
+        return zlib.compress(buf, self.level)
+
+    def decompress(self, buf):
+        return zlib.decompress(buf)
+
+
+class LzmaCodec(Codec):
+
+    codec_id = 2
+
+    def __init__(self, preset=6):
+        self.preset = preset
+
+    def compress(self, buf):
+        return lzma.compress(buf, preset=self.preset)
+
+    def decompress(self, buf):
+        return lzma.decompress(buf)
+
+
+_codecs = {}
+
+
+def register_codec(cls):
+    """register a codec class, required for reading its pages"""
+    if cls.codec_id in _codecs and _codecs[cls.codec_id] != cls:
+        raise Exception("codec id already in use", cls.codec_id)
+    _codecs[cls.codec_id] = cls
+    return cls
+
+
+def get_codec(codec_id):
+    if codec_id not in _codecs:
+        raise Exception("unknown codec", codec_id)
+    return _codecs[codec_id]()
+
+
+register_codec(ZlibCodec)
+register_codec(LzmaCodec)
+
+
+def is_packed(buf):
+    return bytes(buf[: len(CODEC_MAGIC)]) == CODEC_MAGIC
+
+
+def is_paged(buf):
+    return bytes(buf[: len(PAGE_MAGIC)]) == PAGE_MAGIC
+
+
+def page_size(size):
+    """allocation for a page of size bytes, with room to grow"""
+    return (size // PAGE_ALIGN + 1) * PAGE_ALIGN
+
+
+def page_stub(pos, size, link_size):
+    """element data of a leaf whose compressed nodes are in the page at pos"""
+    return (
+        PAGE_MAGIC
+        + bytes(to_bytes(pos, link_size))
+        + bytes(to_bytes(size, COUNT_SIZE))
+    )
+
+
+def read_stub(buf, link_size):
+    """returns position and allocated size of the page a stub points to"""
+    buf = buf[len(PAGE_MAGIC) :]
+    return from_bytes(buf[:link_size]), from_bytes(
+        buf[link_size : link_size + COUNT_SIZE]
+    )
+
+
+def _encode(conv, value):
+    return conv.encode(value) if conv else bytes(value)
+
+
+def _decode(conv, buf):
+    return conv.decode(buf) if conv else buf
+
+
+def _item(buf):
+    ilen = from_bytes(buf[:ITEM_LEN_SIZE])
+    return bytes(buf[ITEM_LEN_SIZE : ITEM_LEN_SIZE + ilen]), buf[ITEM_LEN_SIZE + ilen :]
+
+
+def pack_nodes(nodelist, leaf, codec, link_size, conv_key=None, conv_data=None):
+    """encode and compress the nodes of an element,
+    a leaf with key and data, an inner element with key and child links"""
+    buf = []
+    buf.extend(to_bytes(nodelist.parent, link_size))
+    buf.extend(to_bytes(len(nodelist), COUNT_SIZE))
+    for n in nodelist:
+        if leaf:
+            items = [_encode(conv_key, n.key), _encode(conv_data, n.data)]
+        else:
+            buf.extend(to_bytes(n.left, link_size))
+            buf.extend(to_bytes(n.right, link_size))
+            items = [_encode(conv_key, n.key)]
+        for item in items:
+            buf.extend(to_bytes(len(item), ITEM_LEN_SIZE))
+            buf.extend(item)
+    cbuf = codec.compress(bytes(buf))
+    head = CODEC_MAGIC + bytes([codec.codec_id, LEAF if leaf else INNER])
+    return head + bytes(to_bytes(len(cbuf), COUNT_SIZE)) + cbuf
+
+
+def unpack_nodes(buf, link_size, conv_key=None, conv_data=None, codec=None):
+    """decompress an element packed with pack_nodes(), returns a `NodeList`"""
+    mlen = len(CODEC_MAGIC)
+    codec_id = buf[mlen]
+    kind = buf[mlen + 1]
+    if codec == None or codec.codec_id != codec_id:
+        codec = get_codec(codec_id)
+    buf = buf[mlen + 2 :]
+    clen = from_bytes(buf[:COUNT_SIZE])
+    buf = codec.decompress(bytes(buf[COUNT_SIZE : COUNT_SIZE + clen]))
+
+    nodelist = NodeList()
+    nodelist.parent = from_bytes(buf[:link_size])
+    cnt = from_bytes(buf[link_size : link_size + COUNT_SIZE])
+    buf = buf[link_size + COUNT_SIZE :]
+
+    for i in range(0, cnt):
+        if kind == LEAF:
+            key, buf = _item(buf)
+            data, buf = _item(buf)
+            n = Node(key=_decode(conv_key, key), data=_decode(conv_data, data))
+        else:
+            left = from_bytes(buf[:link_size])
+            right = from_bytes(buf[link_size : 2 * link_size])
+            key, buf = _item(buf[2 * link_size :])
+            n = Node(key=_decode(conv_key, key), left=left, right=right)
+        nodelist.insert(n)
+
+    return nodelist
@@ -0,0 +1,180 @@
+from bisect import bisect_left
+
+from .bptree import Context
+from .btcompact import CompactElement
+
+# leafs to follow along the leaf chain before seek() descends from the root
+GALLOP_LEAFS = 2
+
+
+class Cursor(object):
+    """position in the leaf chain of a tree, kept between calls.
+
+    the cursor holds one leaf in compact form and the index in it.
+    the leaf version of the tree, see `BPlusTree.leaf_version()`, is
+    remembered with the leaf. if the leaf was written or freed since,
+    the cursor finds its position again by the current key.
+
+    next() and prev() return False when moving past the last or first key,
+    the cursor then stays there and can move back."""
+
+    def __init__(self, bpt):
+        self.bpt = bpt
+        self.page = None
+        self.version = None
+        self.idx = 0
+        # key at the cursor, to find the position again
+        self._key = None
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( pos: "
+            + hex(self.page.pos if self.page != None else 0)
+            + " idx: "
+            + str(self.idx)
+            + " key: "
+            + str(self._key)
+            + " )"
+        )
+
+    @property
+    def valid(self):
+        self._revalidate()
+        return self._valid()
+
+    def _valid(self):
+        return self.page != None and self.idx >= 0 and self.idx < len(self.page)
+
+    @property
+    def key(self):
+        self._revalidate()
+        return self.page.keys[self.idx]
+
+    @property
+    def data(self):
+        self._revalidate()
+        return self.page.data[self.idx]
+
+    def node(self):
+        self._revalidate()
+        return self.page.node(self.idx)
+
+    # positioning
+
+    def _read_leaf(self, pos):
+        # leafs are not kept by the context, a scan holds only one of them
+        self.version = self.bpt.leaf_version(pos)
+        return CompactElement.from_btelem(self.bpt._read_elem(pos))
+
+    def _set(self, page, idx):
+        self.page = page
+        self.idx = idx
+        self._key = page.keys[idx] if self._valid() else None
+        return self._valid()
+
+    def _skip_forward(self):
+        while self.idx >= len(self.page) and self.page.succ > 0:
+            self.page = self._read_leaf(self.page.succ)
+            self.idx = 0
+        return self._set(self.page, self.idx)
+
+    def _skip_backward(self):
+        while self.idx < 0 and self.page.prev > 0:
+            self.page = self._read_leaf(self.page.prev)
+            self.idx = len(self.page) - 1
+        return self._set(self.page, self.idx)
+
+    def _revalidate(self):
+        """find the position again if the leaf changed meanwhile.
+        returns False if the key at the cursor is gone, the cursor
+        is then on the next key"""
+        if self.page == None:
+            return True
+        if self.version == self.bpt.leaf_version(self.page.pos):
+            return True
+        if self._valid() == False:
+            # past either end of the tree
+            if self.idx < 0:
+                self.first()
+                self.idx = -1
+            else:
+                self.last()
+                self.idx = len(self.page)
+            self._key = None
+            return True
+        key = self._key
+        self._descend(key)
+        return self._key == key
+
+    def first(self):
+        pos = self.bpt.first_pos
+        if pos == 0:
+            raise Exception("not initialized")
+        self.page = self._read_leaf(pos)
+        self.idx = 0
+        return self._skip_forward()
+
+    def last(self):
+        pos = self.bpt.last_pos
+        if pos == 0:
+            raise Exception("not initialized")
+        self.page = self._read_leaf(pos)
+        self.idx = len(self.page) - 1
+        return self._skip_backward()
+
+    def next(self):
+        if self.page == None:
+            return self.first()
+        if self._revalidate() == False:
+            # already moved on to the next key
+            return self._valid()
+        if self.idx < len(self.page):
+            self.idx += 1
+        return self._skip_forward()
+
+    def prev(self):
+        if self.page == None:
+            return self.last()
+        self._revalidate()
+        if self.idx >= 0:
+            self.idx -= 1
+        return self._skip_backward()
+
+    def seek(self, key):
+        """move to the first key not less than key.
+        keys ahead in the next leafs are found along the leaf chain,
+        otherwise the cursor descends from the root"""
+        self._revalidate()
+        page = self.page
+        if page != None and len(page) > 0 and key >= page.keys[0]:
+            for i in range(0, GALLOP_LEAFS):
+                if key <= page.keys[-1]:
+                    return self._set(page, bisect_left(page.keys, key))
+                if page.succ == 0:
+                    return self._set(page, len(page))
+                page = self._read_leaf(page.succ)
+        return self._descend(key)
+
+    def _descend(self, key):
+        # inner elements from a new context, they may have changed meanwhile
+        ctx = Context(self.bpt)
+        pos = self.bpt.root_pos
+        page = ctx._read_compact(pos)
+        while page.leaf == False:
+            pos = page.child_pos(key)
+            if pos == 0:
+                pos = self.bpt.last_pos
+                break
+            page = ctx._read_compact(pos)
+        self.page = self._read_leaf(pos)
+        self.idx = bisect_left(self.page.keys, key)
+        return self._skip_forward()
+
+    def __iter__(self):
+        """nodes from the cursor on, moving forward"""
+        if self.page == None:
+            self.first()
+        while self.valid == True:
+            yield self.node()
+            self.next()
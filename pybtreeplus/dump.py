@@ -0,0 +1,64 @@
+from pyheapfile.heap import to_bytes, from_bytes
+
+from .bulk import BULK_FILL
+
+DUMP_MAGIC = bytes([0xBF, 0x7E, 0xD0, 0x01])
+
+LEN_SIZE = 4
+
+# record flags
+DUMP_END = 0
+DUMP_ITEM = 1
+
+
+def _encode(conv, value):
+    return conv.encode(value) if conv else bytes(value)
+
+
+def _decode(conv, buf):
+    return conv.decode(buf) if conv else buf
+
+
+def _read(fd, size):
+    buf = fd.read(size)
+    if len(buf) != size:
+        raise Exception("dump truncated")
+    return buf
+
+
+def dump(bpt, fd):
+    """write all nodes of the tree in key order to the binary file fd.
+    only one leaf element is held in memory. returns the number of nodes"""
+    fd.write(DUMP_MAGIC)
+    cnt = 0
+    for n in bpt.iter_first():
+        key = _encode(bpt.conv_key, n.key)
+        data = _encode(bpt.conv_data, n.data)
+        fd.write(bytes([DUMP_ITEM]))
+        fd.write(to_bytes(len(key), LEN_SIZE))
+        fd.write(key)
+        fd.write(to_bytes(len(data), LEN_SIZE))
+        fd.write(data)
+        cnt += 1
+    fd.write(bytes([DUMP_END]))
+    return cnt
+
+
+def iter_dump(fd, conv_key=None, conv_data=None):
+    """iterate the (key, data) pairs of a dump written by dump()"""
+    if _read(fd, len(DUMP_MAGIC)) != DUMP_MAGIC:
+        raise Exception("no b+tree dump")
+    while True:
+        flag = _read(fd, 1)[0]
+        if flag == DUMP_END:
+            return
+        if flag != DUMP_ITEM:
+            raise Exception("dump broken", flag)
+        key = _read(fd, from_bytes(_read(fd, LEN_SIZE)))
+        data = _read(fd, from_bytes(_read(fd, LEN_SIZE)))
+        yield _decode(conv_key, key), _decode(conv_data, data)
+
+
+def load(bpt, fd, fill=BULK_FILL):
+    """build the empty tree bpt bottom up from a dump. returns the number of nodes"""
+    return bpt.bulk_load(iter_dump(fd, bpt.conv_key, bpt.conv_data), fill=fill)
@@ -0,0 +1,95 @@
+import os
+import threading
+
+# durability modes, applied when a context is done
+# nothing, the heap file is flushed on close only
+DURABILITY_NONE = 0
+# flush the heap file, the data survives a crash of the process
+DURABILITY_FLUSH = 1
+# flush and fsync the heap file, the data survives a crash of the os
+DURABILITY_FSYNC = 2
+# flush, and fsync in the background every interval or max_commits
+DURABILITY_GROUP = 3
+
+# strictness of the modes, group commit defers the fsync
+DURABILITY_RANK = {
+    DURABILITY_NONE: 0,
+    DURABILITY_FLUSH: 1,
+    DURABILITY_GROUP: 2,
+    DURABILITY_FSYNC: 3,
+}
+
+GROUP_INTERVAL_MS = 50
+GROUP_COMMITS = 0x40
+
+
+def fsync_path(path):
+    """fsync a file by its path, with a file descriptor of its own"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommit(object):
+    """fsync of a heap file shared by several commits.
+
+    commit() is called after the heap file was flushed. the fsync is done
+    by a background thread at most interval_ms later, or at once with
+    max_commits commits pending. the thread only uses a file descriptor
+    of its own, and does not touch the heap file object."""
+
+    def __init__(
+        self, path, interval_ms=GROUP_INTERVAL_MS, max_commits=GROUP_COMMITS
+    ):
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.max_commits = max_commits
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.syncs = 0
+
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( pending: "
+            + str(self.pending)
+            + " syncs: "
+            + str(self.syncs)
+            + " )"
+        )
+
+    def commit(self):
+        with self.lock:
+            self.pending += 1
+            if self.pending < self.max_commits:
+                return
+        self.sync()
+
+    def sync(self):
+        """fsync now if commits are pending"""
+        with self.lock:
+            if self.pending == 0:
+                return
+            fsync_path(self.path)
+            self.pending = 0
+            self.syncs += 1
+
+    def _run(self):
+        while self._stopped == False:
+            self._wakeup.wait(self.interval)
+            self.sync()
+
+    def stop(self):
+        """stop the background thread, pending commits are synced"""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+        self.sync()
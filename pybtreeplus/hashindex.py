@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+# keys held in the index
+HASH_KEYS = 0x400
+# lookups of a key before it is taken into the index
+HASH_HOT = 3
+
+
+class AdaptiveHashIndex(object):
+    """in-memory index from frequently searched keys to their leaf.
+
+    keys found by a full descent are counted. a key found hot times is
+    taken into the index with the leaf position and leaf version, see
+    `BPlusTree.leaf_version()`. entries with a changed leaf are dropped
+    on lookup. both the counts and the index are lru bounded."""
+
+    def __init__(self, bpt, max_keys=HASH_KEYS, hot=HASH_HOT):
+        self.bpt = bpt
+        self.max_keys = max_keys
+        self.hot = hot
+
+        # key -> (leaf position, leaf version)
+        self.index = OrderedDict()
+        # leaf position -> keys in the index
+        self.leafs = {}
+        # key -> lookups, of keys not yet in the index
+        self.counts = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( keys: "
+            + str(len(self.index))
+            + " hits: "
+            + str(self.hits)
+            + " misses: "
+            + str(self.misses)
+            + " )"
+        )
+
+    def lookup(self, key):
+        """position of the leaf holding key, or None"""
+        entry = self.index.get(key)
+        if entry == None:
+            self.misses += 1
+            return None
+        pos, version = entry
+        if version != self.bpt.leaf_version(pos):
+            self.invalidate_leaf(pos)
+            self.misses += 1
+            return None
+        self.index.move_to_end(key)
+        self.hits += 1
+        return pos
+
+    def note(self, key, pos):
+        """count a key found in leaf pos by a full descent"""
+        cnt = self.counts.pop(key, 0) + 1
+        if cnt < self.hot:
+            self.counts[key] = cnt
+            while len(self.counts) > self.max_keys:
+                self.counts.popitem(last=False)
+            return
+        self.discard(key)
+        self.index[key] = (pos, self.bpt.leaf_version(pos))
+        self.leafs.setdefault(pos, set()).add(key)
+        while len(self.index) > self.max_keys:
+            self.discard(next(iter(self.index)))
+
+    def discard(self, key):
+        entry = self.index.pop(key, None)
+        if entry != None:
+            keys = self.leafs[entry[0]]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.leafs[entry[0]]
+
+    def invalidate_leaf(self, pos):
+        """drop all keys of a leaf that was split, merged or freed"""
+        for key in self.leafs.pop(pos, []):
+            self.index.pop(key, None)
+
+    def clear(self):
+        self.index.clear()
+        self.leafs.clear()
+        self.counts.clear()
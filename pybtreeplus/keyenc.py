@@ -0,0 +1,217 @@
+import struct
+
+# type codes, their order is the order of values of different types
+CODE_NONE = 0x00
+CODE_BYTES = 0x01
+CODE_STR = 0x02
+CODE_TUPLE = 0x05
+CODE_INT = 0x0C
+CODE_FLOAT = 0x0D
+
+# terminates bytes, str and tuples. inside them a 0x00 is escaped as 0x00 0xFF
+END = 0x00
+ESCAPE = 0xFF
+
+INT_SIZE = 8
+INT_BIAS = 1 << (INT_SIZE * 8 - 1)
+
+
+def _encode_bytes(buf, out):
+    for b in buf:
+        out.append(b)
+        if b == END:
+            out.append(ESCAPE)
+    out.append(END)
+
+
+def _encode_float(value):
+    if value == 0:
+        # -0.0 equals 0.0
+        value = 0.0
+    buf = bytearray(struct.pack(">d", value))
+    if buf[0] & 0x80:
+        # negative, reverse the order of all bits
+        return bytes(map(lambda x: x ^ 0xFF, buf))
+    buf[0] |= 0x80
+    return bytes(buf)
+
+
+def _decode_float(buf):
+    buf = bytearray(buf)
+    if buf[0] & 0x80:
+        buf[0] &= 0x7F
+    else:
+        buf = bytearray(map(lambda x: x ^ 0xFF, buf))
+    return struct.unpack(">d", bytes(buf))[0]
+
+
+def _encode(value, out, nested):
+    if value == None:
+        out.append(CODE_NONE)
+        if nested == True:
+            # tell it apart from the end of the tuple
+            out.append(ESCAPE)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(CODE_BYTES)
+        _encode_bytes(bytes(value), out)
+    elif isinstance(value, str):
+        out.append(CODE_STR)
+        _encode_bytes(value.encode(), out)
+    elif isinstance(value, tuple):
+        out.append(CODE_TUPLE)
+        for v in value:
+            _encode(v, out, True)
+        out.append(END)
+    elif isinstance(value, int):
+        if value < -INT_BIAS or value >= INT_BIAS:
+            raise Exception("int out of range", value)
+        out.append(CODE_INT)
+        out.extend((value + INT_BIAS).to_bytes(INT_SIZE, "big"))
+    elif isinstance(value, float):
+        out.append(CODE_FLOAT)
+        out.extend(_encode_float(value))
+    else:
+        raise Exception("type not supported", type(value))
+
+
+def _decode_bytes(buf, pos):
+    out = bytearray()
+    while True:
+        b = buf[pos]
+        pos += 1
+        if b == END:
+            if pos < len(buf) and buf[pos] == ESCAPE:
+                out.append(END)
+                pos += 1
+                continue
+            return bytes(out), pos
+        out.append(b)
+
+
+def _decode(buf, pos, nested):
+    code = buf[pos]
+    pos += 1
+    if code == CODE_NONE:
+        if nested == True:
+            pos += 1
+        return None, pos
+    if code == CODE_BYTES:
+        return _decode_bytes(buf, pos)
+    if code == CODE_STR:
+        value, pos = _decode_bytes(buf, pos)
+        return value.decode(), pos
+    if code == CODE_TUPLE:
+        values = []
+        while not (buf[pos] == END and buf[pos + 1 : pos + 2] != bytes([ESCAPE])):
+            value, pos = _decode(buf, pos, True)
+            values.append(value)
+        return tuple(values), pos + 1
+    if code == CODE_INT:
+        value = int.from_bytes(buf[pos : pos + INT_SIZE], "big") - INT_BIAS
+        return value, pos + INT_SIZE
+    if code == CODE_FLOAT:
+        return _decode_float(buf[pos : pos + 8]), pos + 8
+    raise Exception("unknown type code", code)
+
+
+def encode_key(value):
+    """encode None, bytes, str, int, float, and tuples of these,
+    so that comparing the encoded bytes gives the order of the values.
+
+    values of different types are ordered by type, in the order above,
+    except tuples that come between str and int. ints and floats are not
+    compared by value with each other. ints are limited to 64 bit"""
+    out = bytearray()
+    _encode(value, out, False)
+    return bytes(out)
+
+
+def decode_key(buf):
+    buf = bytes(buf)
+    value, pos = _decode(buf, 0, False)
+    if pos != len(buf):
+        raise Exception("trailing bytes in key", len(buf) - pos)
+    return value
+
+
+class ConvertKeyBytes(object):
+    """keys stay in encoded form in the tree, search and bisect then
+    compare plain bytes. encode the keys with encode_key() before use"""
+
+    def encode(self, value):
+        return bytes(value)
+
+    def decode(self, buf):
+        return bytes(buf)
+
+
+class OrderedKey(object):
+    """a key in encoded form, compared by the encoded bytes.
+    compares with plain values as well, these are encoded for it.
+    the value is decoded on first access only"""
+
+    def __init__(self, buf):
+        self.buf = bytes(buf)
+        self._value = None
+        self._decoded = False
+
+    @staticmethod
+    def of(value):
+        """value as OrderedKey, to encode a search key once"""
+        if isinstance(value, OrderedKey):
+            return value
+        return OrderedKey(encode_key(value))
+
+    @property
+    def value(self):
+        if self._decoded == False:
+            self._value = decode_key(self.buf)
+            self._decoded = True
+        return self._value
+
+    def __repr__(self):
+        return self.__class__.__name__ + "( " + repr(self.value) + " )"
+
+    def __hash__(self):
+        # same as the plain value, both are equal
+        return hash(self.value)
+
+    def _other(self, other):
+        return other.buf if isinstance(other, OrderedKey) else encode_key(other)
+
+    def __eq__(self, other):
+        try:
+            return self.buf == self._other(other)
+        except Exception:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        return self.buf < self._other(other)
+
+    def __le__(self, other):
+        return self.buf <= self._other(other)
+
+    def __gt__(self, other):
+        return self.buf > self._other(other)
+
+    def __ge__(self, other):
+        return self.buf >= self._other(other)
+
+
+class ConvertOrderedKey(object):
+    """keys are stored with encode_key(), the tree holds them as
+    `OrderedKey`. search and bisect then compare the encoded bytes,
+    in the order of encode_key(), also for mixed types and None.
+    the values are only decoded when accessed.
+    allows tuples as composite keys, e.g. for secondary indexes"""
+
+    def encode(self, value):
+        if isinstance(value, OrderedKey):
+            return value.buf
+        return encode_key(value)
+
+    def decode(self, buf):
+        return OrderedKey(buf)
@@ -0,0 +1,131 @@
+from bisect import bisect_right, insort
+
+# keys held before the buffer is merged into the tree
+MEMTABLE_KEYS = 0x1000
+
+
+class _Tombstone(object):
+    """compared by identity, a stored value may equal anything"""
+
+    def __repr__(self):
+        return "TOMBSTONE"
+
+
+# data of a deleted key, see BPlusTree.write_batch()
+TOMBSTONE = _Tombstone()
+
+
+class MemTable(object):
+    """sorted in-memory write buffer in front of a `BPlusTree`.
+
+    puts and deletes go to the buffer, a delete is kept as tombstone
+    until merged. reads look into the buffer first, then into the tree.
+    with max_keys buffered, or on `flush()`, the buffer is merged into
+    the tree in key order with `BPlusTree.write_batch()`, so random keys
+    become sequential changes of the leafs. the buffer is not persistent,
+    call `flush()` before the tree is closed."""
+
+    def __init__(self, bpt, max_keys=MEMTABLE_KEYS):
+        self.bpt = bpt
+        self.max_keys = max_keys
+
+        # key -> data, or TOMBSTONE
+        self.entries = {}
+        # buffered keys, sorted
+        self.keys = []
+
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( keys: "
+            + str(len(self.keys))
+            + " flushes: "
+            + str(self.flushes)
+            + " )"
+        )
+
+    def _set(self, key, data):
+        if key not in self.entries:
+            insort(self.keys, key)
+        self.entries[key] = data
+        if len(self.keys) >= self.max_keys:
+            self.flush()
+
+    def put(self, key, data):
+        self._set(key, data)
+
+    def delete(self, key):
+        self._set(key, TOMBSTONE)
+
+    def flush(self):
+        """merge the buffer into the tree, returns the number of keys changed"""
+        if len(self.keys) == 0:
+            return 0
+        items = [(key, self.entries[key]) for key in self.keys]
+        self.entries = {}
+        self.keys = []
+        self.flushes += 1
+        return self.bpt.write_batch(items)
+
+    # read methods
+
+    def get(self, key, default=None):
+        if key in self.entries:
+            data = self.entries[key]
+            return default if data is TOMBSTONE else data
+        n, btelem, rc, ctx = self.bpt.search_node(key)
+        return n.data if rc == True else default
+
+    def contains(self, key):
+        if key in self.entries:
+            return self.entries[key] is not TOMBSTONE
+        return self.bpt.contains(key)
+
+    def get_many(self, keys):
+        """data of the keys in order, or None for a missing key"""
+        missing = list(filter(lambda x: x not in self.entries, keys))
+        found = dict(zip(missing, self.bpt.get_many(missing)))
+        result = []
+        for key in keys:
+            if key in self.entries:
+                data = self.entries[key]
+                result.append(None if data is TOMBSTONE else data)
+                continue
+            n = found[key]
+            result.append(n.data if n != None else None)
+        return result
+
+    def iter_range(self, lower=None, upper=None):
+        """iterate (key, data) with lower < key <= upper in key order,
+        None for an open range. buffered keys hide the keys in the tree"""
+        i = bisect_right(self.keys, lower) if lower != None else 0
+        j = bisect_right(self.keys, upper) if upper != None else len(self.keys)
+        keys = self.keys[i:j]
+        entries = self.entries
+
+        k = 0
+        for n in self.bpt.iter_range(lower, upper):
+            while k < len(keys) and keys[k] < n.key:
+                data = entries[keys[k]]
+                if data is not TOMBSTONE:
+                    yield keys[k], data
+                k += 1
+            if k < len(keys) and keys[k] == n.key:
+                data = entries[keys[k]]
+                if data is not TOMBSTONE:
+                    yield keys[k], data
+                k += 1
+                continue
+            yield n.key, n.data
+        for key in keys[k:]:
+            data = entries[key]
+            if data is not TOMBSTONE:
+                yield key, data
+
+    def __iter__(self):
+        return self.iter_range()
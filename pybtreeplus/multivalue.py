@@ -0,0 +1,243 @@
+from pyheapfile.heap import to_bytes, from_bytes
+
+from .btheap import alloc_page, read_page, write_page, free_page
+from .bptree import Context
+
+# size of the first page of a posting list, following pages double in size
+POSTING_FIRST_PAGE = 0x40
+POSTING_MAX_PAGE = 0x1000
+
+COUNT_SIZE = 4
+VALUE_LEN_SIZE = 2
+
+
+class PostingPage(object):
+    """one page of a posting list chain"""
+
+    def __init__(self, link_size, size, node=None):
+        self.link_size = link_size
+        self.size = size
+        self.node = node
+        self.next = 0
+        # head page only
+        self.tail = 0
+        self.count = 0
+        self.values = []
+
+    @property
+    def pos(self):
+        return self.node.pos
+
+    def header_size(self):
+        return 2 * self.link_size + 2 * COUNT_SIZE
+
+    def used(self):
+        return self.header_size() + sum(
+            map(lambda x: VALUE_LEN_SIZE + len(x), self.values)
+        )
+
+    def fits(self, buf):
+        return self.used() + VALUE_LEN_SIZE + len(buf) <= self.size
+
+    def to_bytes(self):
+        buf = []
+        buf.extend(to_bytes(self.next, self.link_size))
+        buf.extend(to_bytes(self.tail, self.link_size))
+        buf.extend(to_bytes(self.size, COUNT_SIZE))
+        buf.extend(to_bytes(self.count, COUNT_SIZE))
+        for v in self.values:
+            buf.extend(to_bytes(len(v), VALUE_LEN_SIZE))
+            buf.extend(v)
+        return bytes(buf)
+
+    def from_bytes(self, buf):
+        ls = self.link_size
+        self.next = from_bytes(buf[0:ls])
+        self.tail = from_bytes(buf[ls : 2 * ls])
+        buf = buf[2 * ls :]
+        self.size = from_bytes(buf[0:COUNT_SIZE])
+        self.count = from_bytes(buf[COUNT_SIZE : 2 * COUNT_SIZE])
+        buf = buf[2 * COUNT_SIZE :]
+        self.values = []
+        while len(buf) > 0:
+            vlen = from_bytes(buf[0:VALUE_LEN_SIZE])
+            self.values.append(buf[VALUE_LEN_SIZE : VALUE_LEN_SIZE + vlen])
+            buf = buf[VALUE_LEN_SIZE + vlen :]
+        return self
+
+
+class PostingList(object):
+    """chain of heap pages holding all values of one key.
+    the head page keeps the position of the tail page and the total count,
+    so appending touches at most the head and the tail page.
+    pages are written to the heap file at once, not through a `Context`,
+    so an abort does not undo an append."""
+
+    def __init__(
+        self,
+        heap_fd,
+        link_size,
+        conv_value=None,
+        first_page=POSTING_FIRST_PAGE,
+        max_page=POSTING_MAX_PAGE,
+    ):
+        self.heap_fd = heap_fd
+        self.link_size = link_size
+        self.conv_value = conv_value
+        self.first_page = first_page
+        self.max_page = max_page
+
+    def _encode(self, value):
+        buf = self.conv_value.encode(value) if self.conv_value else bytes(value)
+        page = PostingPage(self.link_size, self.max_page)
+        if page.fits(buf) == False:
+            raise Exception("value too large for posting page")
+        return buf
+
+    def _decode(self, buf):
+        return self.conv_value.decode(buf) if self.conv_value else buf
+
+    def _alloc(self, size):
+        page = PostingPage(self.link_size, size)
+        page.node = alloc_page(self.heap_fd, size)
+        return page
+
+    def _read(self, pos):
+        node, buf = read_page(self.heap_fd, pos)
+        page = PostingPage(self.link_size, 0, node=node)
+        return page.from_bytes(buf)
+
+    def _write(self, page):
+        write_page(self.heap_fd, page.node, page.to_bytes())
+
+    def create(self, values=None):
+        """create a new posting list, returns the position of the head page"""
+        head = self._alloc(self.first_page)
+        head.tail = head.pos
+        self._write(head)
+        for value in values if values != None else []:
+            self.append(head.pos, value)
+        return head.pos
+
+    def append(self, head_pos, value):
+        buf = self._encode(value)
+
+        head = self._read(head_pos)
+        tail = head if head.tail == head.pos else self._read(head.tail)
+
+        if tail.fits(buf) == False:
+            # double the size, but at least the room for buf
+            need = tail.header_size() + VALUE_LEN_SIZE + len(buf)
+            page = self._alloc(min(max(tail.size * 2, need), self.max_page))
+            tail.next = page.pos
+            if tail != head:
+                self._write(tail)
+            tail = page
+            head.tail = page.pos
+
+        tail.values.append(buf)
+        head.count += 1
+
+        if tail != head:
+            self._write(tail)
+        self._write(head)
+
+    def count(self, head_pos):
+        return self._read(head_pos).count
+
+    def iter_pages(self, head_pos):
+        pos = head_pos
+        while pos > 0:
+            page = self._read(pos)
+            yield page
+            pos = page.next
+
+    def iter_values(self, head_pos):
+        for page in self.iter_pages(head_pos):
+            for buf in page.values:
+                yield self._decode(buf)
+
+    def free(self, head_pos):
+        for page in list(self.iter_pages(head_pos)):
+            free_page(self.heap_fd, page.node)
+
+
+class MultiValueTree(object):
+    """non-unique index on top of a `BPlusTree`.
+    every key is stored once in the tree, its data is the position of
+    a `PostingList` holding all values of the key in insertion order.
+    the tree needs an integer data converter. posting lists of new keys
+    are freed by `Context.abort()`, and those of removed keys only when
+    the context is done. appending to an existing posting list changes
+    it in place, this is not undone by an abort."""
+
+    def __init__(
+        self,
+        bpt,
+        conv_value=None,
+        first_page=POSTING_FIRST_PAGE,
+        max_page=POSTING_MAX_PAGE,
+    ):
+        self.bpt = bpt
+        self.postings = PostingList(
+            bpt.btcore.heap_fd,
+            bpt.link_size,
+            conv_value=conv_value,
+            first_page=first_page,
+            max_page=max_page,
+        )
+
+    def __repr__(self):
+        return self.__class__.__name__ + "( " + repr(self.bpt) + " )"
+
+    def add(self, key, value, ctx=None, ctx_close=True):
+        """append value to the posting list of key.
+        the leaf is only written when the key is new."""
+        if ctx == None:
+            ctx = Context(self.bpt)
+
+        def _add(n):
+            if n != None:
+                self.postings.append(n.data, value)
+                return False, None
+            head_pos = self.postings.create([value])
+            # a new posting list is dropped together with the key
+            ctx.on_abort(lambda: self.postings.free(head_pos))
+            return True, head_pos
+
+        self.bpt._upsert(key, _add, ctx=ctx, ctx_close=ctx_close)
+
+    def _head_pos(self, key, ctx=None):
+        n, btelem, rc, ctx = self.bpt.search_node(key, ctx=ctx)
+        return n.data if rc == True else 0
+
+    def count(self, key, ctx=None):
+        head_pos = self._head_pos(key, ctx=ctx)
+        return self.postings.count(head_pos) if head_pos > 0 else 0
+
+    def iter_values(self, key, ctx=None):
+        head_pos = self._head_pos(key, ctx=ctx)
+        if head_pos > 0:
+            yield from self.postings.iter_values(head_pos)
+
+    def get(self, key, ctx=None):
+        return list(self.iter_values(key, ctx=ctx))
+
+    def iter_first(self):
+        """iterate all (key, value) pairs in key order"""
+        for n in self.bpt.iter_first():
+            for value in self.postings.iter_values(n.data):
+                yield n.key, value
+
+    def remove(self, key, ctx=None, ctx_close=True):
+        """remove key together with all its values"""
+        n, btelem, rc, ctx = self.bpt.search_node(key, ctx=ctx)
+        if rc == False:
+            return False
+        head_pos = n.data
+        self.bpt.delete_from_leaf(key, btelem, ctx=ctx, ctx_close=False)
+        # freed once the key is gone, kept if the context is aborted
+        ctx.on_done(lambda: self.postings.free(head_pos))
+        if ctx_close == True:
+            ctx.done()
+        return True
@@ -0,0 +1,167 @@
+import io
+
+from pyheapfile.heap import to_bytes, from_bytes
+from pybtreecore.btcore import DATA_SIZE
+
+from .btheap import alloc_page, read_page, write_page, free_page
+
+OVERFLOW_PAGE = 0x1000
+
+INLINE_LEN_SIZE = 2
+
+TAG_INLINE = 0
+TAG_OVERFLOW = 1
+
+
+class OverflowRef(object):
+    """reference to a value stored out of line in a chain of heap pages"""
+
+    def __init__(self, store, pos, size, conv=None):
+        self.store = store
+        self.pos = pos
+        self.size = size
+        self.conv = conv
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( pos: "
+            + hex(self.pos)
+            + " size: "
+            + str(self.size)
+            + " )"
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, OverflowRef) == False:
+            return False
+        return self.pos == other.pos and self.size == other.size
+
+    def iter_chunks(self):
+        return self.store.iter_chunks(self.pos)
+
+    def read(self):
+        return bytes().join(self.iter_chunks())
+
+    def value(self):
+        buf = self.read()
+        return self.conv.decode(buf) if self.conv else buf
+
+    def free(self):
+        self.store.free(self.pos)
+
+
+class OverflowStore(object):
+    """out of line storage for large values.
+    a value is written as a chain of heap pages, every page starts
+    with the position of the next page."""
+
+    def __init__(self, heap_fd, link_size, page_size=OVERFLOW_PAGE):
+        self.heap_fd = heap_fd
+        self.link_size = link_size
+        self.page_size = page_size
+
+    def _chunk_size(self):
+        return self.page_size - self.link_size
+
+    def _write(self, node, next_pos, buf):
+        write_page(self.heap_fd, node, bytes(to_bytes(next_pos, self.link_size)) + buf)
+
+    def write_stream(self, fd, conv=None):
+        """write all data readable from fd, returns an `OverflowRef`.
+        only one page is held in memory at a time."""
+        first_pos = 0
+        size = 0
+        prev_node = None
+        prev_buf = None
+
+        while True:
+            buf = fd.read(self._chunk_size())
+            if len(buf) == 0:
+                break
+            node = alloc_page(self.heap_fd, self.page_size)
+            if prev_node != None:
+                self._write(prev_node, node.pos, prev_buf)
+            else:
+                first_pos = node.pos
+            prev_node, prev_buf = node, buf
+            size += len(buf)
+
+        if prev_node != None:
+            self._write(prev_node, 0, prev_buf)
+
+        return OverflowRef(self, first_pos, size, conv=conv)
+
+    def write(self, buf, conv=None):
+        return self.write_stream(io.BytesIO(buf), conv=conv)
+
+    def iter_chunks(self, pos):
+        while pos > 0:
+            node, buf = read_page(self.heap_fd, pos)
+            pos = from_bytes(buf[: self.link_size])
+            yield buf[self.link_size :]
+
+    def free(self, pos):
+        while pos > 0:
+            node, buf = read_page(self.heap_fd, pos)
+            pos = from_bytes(buf[: self.link_size])
+            free_page(self.heap_fd, node)
+
+
+class ConvertOverflow(object):
+    """data converter keeping small values inline in the leaf,
+    and referencing large values stored in an `OverflowStore`.
+
+    large values must be passed through `wrap()` or `wrap_stream()`
+    before they are inserted into the tree. the tree calls `release()`
+    for the data of a replaced or deleted key, the overflow pages of
+    it are freed when the context is done."""
+
+    def __init__(self, store, conv=None, inline_size=None):
+        self.store = store
+        self.conv = conv
+        if inline_size == None:
+            inline_size = DATA_SIZE - 1 - INLINE_LEN_SIZE
+        self.inline_size = inline_size
+
+    def _encode_value(self, value):
+        return self.conv.encode(value) if self.conv else bytes(value)
+
+    def wrap(self, value):
+        """returns value if it fits inline, or a reference to it after
+        writing it to the overflow store"""
+        if isinstance(value, OverflowRef):
+            return value
+        buf = self._encode_value(value)
+        if len(buf) <= self.inline_size:
+            return value
+        return self.store.write(buf, conv=self.conv)
+
+    def wrap_stream(self, fd):
+        return self.store.write_stream(fd, conv=self.conv)
+
+    def release(self, value):
+        if isinstance(value, OverflowRef):
+            value.free()
+
+    def encode(self, value):
+        if isinstance(value, OverflowRef):
+            link_size = self.store.link_size
+            buf = [TAG_OVERFLOW]
+            buf.extend(to_bytes(value.pos, link_size))
+            buf.extend(to_bytes(value.size, link_size))
+            return bytes(buf)
+        buf = self._encode_value(value)
+        if len(buf) > self.inline_size:
+            raise Exception("value too large for inline storage, use wrap()")
+        return bytes([TAG_INLINE]) + bytes(to_bytes(len(buf), INLINE_LEN_SIZE)) + buf
+
+    def decode(self, buf):
+        if buf[0] == TAG_OVERFLOW:
+            link_size = self.store.link_size
+            pos = from_bytes(buf[1 : 1 + link_size])
+            size = from_bytes(buf[1 + link_size : 1 + 2 * link_size])
+            return OverflowRef(self.store, pos, size, conv=self.conv)
+        size = from_bytes(buf[1 : 1 + INLINE_LEN_SIZE])
+        buf = bytes(buf[1 + INLINE_LEN_SIZE : 1 + INLINE_LEN_SIZE + size])
+        return self.conv.decode(buf) if self.conv else buf
@@ -0,0 +1,76 @@
+import os
+import multiprocessing
+
+from pyheapfile.heap import HeapFile
+from pybtreecore.btcore import BTreeCoreFile
+
+from .bptree import BPlusTree, Context
+
+# key ranges per worker process, more ranges balance uneven subtrees
+RANGES_PER_WORKER = 4
+
+
+def key_ranges(bpt, count):
+    """split the key space into at least count ranges, as far as possible,
+    along the separators of the upper levels.
+    returns (pos, lower, upper) with pos the subtree holding the range."""
+    ctx = Context(bpt)
+    ranges = [(bpt.root_pos, None, None)]
+    while len(ranges) < count:
+        nranges = []
+        for pos, lower, upper in ranges:
+            page = ctx._read_compact(pos)
+            if page.leaf == True:
+                nranges.append((pos, lower, upper))
+            else:
+                nranges.extend(page.child_ranges(lower, upper))
+        if len(nranges) == len(ranges):
+            break
+        ranges = nranges
+    return ranges
+
+
+def _scan_range(args):
+    path, config, pos, lower, upper, func = args
+    keys_per_node, conv_key, conv_data, codec = config
+
+    # every process reads through its own file handle
+    hpf = HeapFile(path).open()
+    try:
+        btcore = BTreeCoreFile(hpf, keys_per_node=keys_per_node)
+        # the subtree is used as root, iter_range() only descends from there
+        bpt = BPlusTree(
+            btcore, root_pos=pos, conv_key=conv_key, conv_data=conv_data, codec=codec
+        )
+        return func(bpt.iter_range(lower, upper))
+    finally:
+        hpf.close()
+
+
+def parallel_scan(bpt, func, workers=None, ordered=True, path=None):
+    """call func(nodes) for every key range in a pool of worker processes.
+    func must be picklable, e.g. a module level function.
+    returns the results in key order if ordered is set,
+    otherwise in order of completion."""
+    if path == None:
+        path = bpt.path
+    if path == None:
+        raise Exception("path of heap file required")
+    if workers == None:
+        workers = os.cpu_count()
+
+    # workers read from the file, not from this process
+    bpt.checkpoint()
+
+    config = (bpt.btcore.keys_per_node, bpt.conv_key, bpt.conv_data, bpt.codec)
+    tasks = list(
+        map(
+            lambda x: (path, config) + x + (func,),
+            key_ranges(bpt, workers * RANGES_PER_WORKER),
+        )
+    )
+
+    with multiprocessing.Pool(workers) as pool:
+        if ordered == True:
+            return list(pool.imap(_scan_range, tasks))
+        return list(pool.imap_unordered(_scan_range, tasks))
@@ -0,0 +1,55 @@
+from .cursor import Cursor
+
+
+def merge_join(left, right):
+    """pairs of nodes (left, right) with the same key in both trees.
+    the side behind skips ahead to the key of the other side"""
+    a, b = Cursor(left), Cursor(right)
+    if not (a.first() and b.first()):
+        return
+    while True:
+        if a.key < b.key:
+            if not a.seek(b.key):
+                return
+        elif b.key < a.key:
+            if not b.seek(a.key):
+                return
+        else:
+            yield a.node(), b.node()
+            if not (a.next() and b.next()):
+                return
+
+
+def intersect(left, right):
+    """nodes of left with a key also in right"""
+    for n, _ in merge_join(left, right):
+        yield n
+
+
+def difference(left, right):
+    """nodes of left with a key missing in right"""
+    a, b = Cursor(left), Cursor(right)
+    valid = a.first()
+    other = b.first()
+    while valid == True:
+        if other == True and b.key < a.key:
+            other = b.seek(a.key)
+            continue
+        if other == False or a.key < b.key:
+            yield a.node()
+        valid = a.next()
+
+
+def union(left, right):
+    """nodes of both trees in key order, left wins for keys in both"""
+    a, b = Cursor(left), Cursor(right)
+    va, vb = a.first(), b.first()
+    while va == True or vb == True:
+        if vb == False or (va == True and a.key <= b.key):
+            if vb == True and a.key == b.key:
+                vb = b.next()
+            yield a.node()
+            va = a.next()
+        else:
+            yield b.node()
+            vb = b.next()
@@ -0,0 +1,76 @@
+from .bptree import Context
+from .durability import DURABILITY_NONE, DURABILITY_RANK
+
+
+class Transaction(object):
+    """context spanning several trees in the same heap file.
+
+    every tree gets its own `Context`, see `ctx()`. `commit()` writes the
+    dirty elements of all trees, then the changed tree headers, and
+    flushes the heap file once. `rollback()` drops all changes and
+    restores the tree headers as they were when the transaction began.
+
+    use as context manager to commit, or rollback on exception::
+
+        with Transaction(primary, secondary) as tx:
+            primary.put(key, data, ctx=tx.ctx(primary), ctx_close=False)
+            secondary.put(data, key, ctx=tx.ctx(secondary), ctx_close=False)
+    """
+
+    def __init__(self, *bpts):
+        if len(bpts) == 0:
+            raise Exception("no tree")
+        self.heap_fd = bpts[0].btcore.heap_fd
+        for bpt in bpts:
+            if bpt.btcore.heap_fd != self.heap_fd:
+                raise Exception("trees in different heap files")
+        self.bpts = list(bpts)
+        self._begin()
+
+    def _begin(self):
+        self.contexts = {}
+        self._states = [(bpt, bpt._header_state()) for bpt in self.bpts]
+
+    def ctx(self, bpt):
+        """the context to use for all operations on bpt"""
+        key = id(bpt)
+        if key not in self.contexts:
+            if bpt not in self.bpts:
+                raise Exception("tree not part of transaction")
+            self.contexts[key] = Context(bpt)
+        return self.contexts[key]
+
+    def commit(self):
+        for ctx in self.contexts.values():
+            ctx._write_changes()
+        # headers go last, after all elements they refer to are written
+        for bpt in self.bpts:
+            bpt._write_header_changed()
+        for bpt in self.bpts:
+            bpt._checkpoint_due()
+        # the strictest durability mode of the trees applies to all
+        bpt = max(self.bpts, key=lambda x: DURABILITY_RANK[x.durability])
+        if bpt.durability == DURABILITY_NONE:
+            self.heap_fd.flush()
+        else:
+            bpt._apply_durability()
+        for ctx in self.contexts.values():
+            ctx._reset()
+        self._begin()
+
+    def rollback(self):
+        for ctx in self.contexts.values():
+            ctx.abort()
+        for bpt, state in self._states:
+            bpt._restore_header_state(state)
+        self._begin()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
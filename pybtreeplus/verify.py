@@ -0,0 +1,196 @@
+import random
+
+from .btcompact import CompactElement
+
+
+class Verifier(object):
+    """incremental integrity check of a tree.
+
+    the tree is walked depth first in key order. `run()` checks at most
+    budget elements and can be called again to resume where it stopped.
+    checked are key order, key bounds given by the parent separators,
+    parent links, fill bounds, the leaf chain (succ and prev), first and
+    last position, and the key count.
+
+    below the root, elements hold at least a third of keys_per_node, the
+    fill delete rebalances at. exempt is the rightmost element of every
+    level, which `BPlusTree.bulk_load()` leaves partial.
+
+    with sample set, only this fraction of the children of an inner
+    element is visited. leaf chain and count are then not checked."""
+
+    def __init__(self, bpt, sample=None, seed=None, start=None):
+        self.bpt = bpt
+        self.sample = sample
+        self.random = random.Random(seed)
+        self.min_keys = int(bpt.btcore.keys_per_node / 3)
+
+        # problems found as tuples of (position, message, ...)
+        self.errors = []
+        self.checked = 0
+        self.keys = 0
+
+        # pending elements as (pos, parent_pos, lower, upper)
+        if start == None:
+            start = (bpt.root_pos, 0, None, None)
+        self._stack = [start]
+
+        # partitions from partition() check only parts of the leaf chain
+        self.is_first = start[2] == None
+        self.is_last = start[3] == None
+        self.is_whole = self.is_first and self.is_last
+
+        # last visited leaf as (pos, succ)
+        self._leaf = None
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( checked: "
+            + str(self.checked)
+            + " keys: "
+            + str(self.keys)
+            + " errors: "
+            + str(len(self.errors))
+            + " pending: "
+            + str(len(self._stack))
+            + " )"
+        )
+
+    @property
+    def done(self):
+        return len(self._stack) == 0
+
+    @property
+    def ok(self):
+        return len(self.errors) == 0
+
+    def _error(self, pos, msg, *args):
+        self.errors.append((pos, msg) + args)
+
+    def run(self, budget=None):
+        """check up to budget elements, or all remaining if None"""
+        cnt = 0
+        while len(self._stack) > 0:
+            if budget != None and cnt >= budget:
+                break
+            self._check(*self._stack.pop())
+            cnt += 1
+        if self.done == True:
+            self._finish()
+        return self
+
+    def partition(self):
+        """split the pending work into independent verifiers,
+        one for every child of the root element"""
+        if self.checked > 0:
+            raise Exception("already started")
+        page = self._read(self.bpt.root_pos)
+        if page == None or page.leaf == True:
+            return [self]
+        self._check_elem(page, 0, None, None)
+        return list(
+            map(
+                lambda x: Verifier(self.bpt, sample=self.sample, start=x),
+                self._childs(page, None, None),
+            )
+        )
+
+    def _read(self, pos):
+        try:
+            return CompactElement.from_btelem(self.bpt._read_elem(pos))
+        except Exception as ex:
+            self._error(pos, "read failed", ex)
+
+    def _childs(self, page, lower, upper):
+        return list(
+            map(lambda x: (x[0], page.pos, x[1], x[2]), page.child_ranges(lower, upper))
+        )
+
+    def _check_elem(self, page, parent_pos, lower, upper):
+        pos = page.pos
+        self.checked += 1
+
+        if page.parent != parent_pos:
+            self._error(pos, "parent broken", hex(page.parent), hex(parent_pos))
+
+        if len(page) == 0:
+            if pos != self.bpt.root_pos:
+                self._error(pos, "empty element")
+            return
+
+        if len(page) > self.bpt.btcore.keys_per_node:
+            self._error(pos, "overflow", len(page))
+        # the rightmost element of a level has no upper bound
+        if pos != self.bpt.root_pos and upper != None:
+            if len(page) < self.min_keys:
+                self._error(pos, "underflow", len(page), self.min_keys)
+
+        for a, b in zip(page.keys, page.keys[1:]):
+            if not a < b:
+                self._error(pos, "wrong order", a, b)
+
+        if lower != None and not page.keys[0] > lower:
+            self._error(pos, "key below lower bound", page.keys[0], lower)
+        if upper != None and not page.keys[-1] <= upper:
+            self._error(pos, "key above upper bound", page.keys[-1], upper)
+
+        if page.leaf == False:
+            if 0 in page.lefts:
+                self._error(pos, "link missing")
+
+    def _check(self, pos, parent_pos, lower, upper):
+        page = self._read(pos)
+        if page == None:
+            return
+
+        self._check_elem(page, parent_pos, lower, upper)
+
+        if page.leaf == True:
+            self._check_leaf(page)
+            return
+
+        childs = self._childs(page, lower, upper)
+        if self.sample != None and len(childs) > 1:
+            childs = list(filter(lambda x: self.random.random() < self.sample, childs))
+            if len(childs) == 0:
+                childs = [self.random.choice(self._childs(page, lower, upper))]
+
+        # leftmost child on top of the stack, to visit the leafs in order
+        self._stack.extend(reversed(childs))
+
+    def _check_leaf(self, page):
+        self.keys += len(page)
+
+        if self.sample != None:
+            return
+
+        if self._leaf == None:
+            if self.is_first == True:
+                if page.pos != self.bpt.first_pos:
+                    self._error(page.pos, "first broken", hex(self.bpt.first_pos))
+                if page.prev != 0:
+                    self._error(page.pos, "prev of first leaf", hex(page.prev))
+        else:
+            prev_pos, prev_succ = self._leaf
+            if prev_succ != page.pos:
+                self._error(prev_pos, "succ broken", hex(prev_succ), hex(page.pos))
+            if page.prev != prev_pos:
+                self._error(page.pos, "prev broken", hex(page.prev), hex(prev_pos))
+
+        self._leaf = (page.pos, page.succ)
+
+    def _finish(self):
+        if self.sample != None or self._leaf == None:
+            return
+
+        if self.is_last == True:
+            pos, succ = self._leaf
+            if pos != self.bpt.last_pos:
+                self._error(pos, "last broken", hex(self.bpt.last_pos))
+            if succ != 0:
+                self._error(pos, "succ of last leaf", hex(succ))
+
+        if self.is_whole == True and self.bpt.header_node != None:
+            if self.keys != self.bpt.count:
+                self._error(0, "count broken", self.keys, self.bpt.count)
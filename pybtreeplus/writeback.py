@@ -0,0 +1,134 @@
+import copy
+import time
+
+from pybtreecore.btcore import BTreeElement
+from pybtreecore.btnodelist import NodeList
+
+from .btcompact import CompactElement
+
+# dirty elements that trigger a checkpoint
+WRITE_BACK_ELEMS = 0x400
+# time between checkpoints
+WRITE_BACK_INTERVAL_MS = 1000
+
+
+class WriteBack(object):
+    """dirty elements of a tree kept in memory across contexts.
+
+    elements are held as snapshots, a context always gets its own copy
+    to modify. `checkpoint()` writes the elements in order of position,
+    then the link only updates, frees the released nodes and writes the
+    tree header last. changes since the last checkpoint are lost on a
+    crash, there is no write ahead log."""
+
+    def __init__(self, bpt, max_elems=WRITE_BACK_ELEMS, interval_ms=None):
+        self.bpt = bpt
+        self.max_elems = max_elems
+        self.interval = interval_ms / 1000 if interval_ms != None else None
+
+        # pos -> (heap_node, dll_elem, compact page)
+        self.elems = {}
+        # pos -> (heap_node, dll_elem), elements with changed links only
+        self.links = {}
+        # pos -> (heap_node, element data), freed at the next checkpoint
+        self.freed = {}
+        self.header = False
+
+        self.writes = 0
+        self.checkpoints = 0
+        self.last = time.monotonic()
+
+    def __len__(self):
+        return len(self.elems) + len(self.links)
+
+    def __repr__(self):
+        return (
+            self.__class__.__name__
+            + "( elems: "
+            + str(len(self.elems))
+            + " links: "
+            + str(len(self.links))
+            + " freed: "
+            + str(len(self.freed))
+            + " writes: "
+            + str(self.writes)
+            + " checkpoints: "
+            + str(self.checkpoints)
+            + " )"
+        )
+
+    def __contains__(self, pos):
+        return pos in self.elems or pos in self.links
+
+    def put(self, btelem):
+        pos = btelem.elem.pos
+        self.links.pop(pos, None)
+        self.elems[pos] = (
+            copy.copy(btelem.node),
+            copy.copy(btelem.elem),
+            CompactElement.from_btelem(btelem),
+        )
+        self.writes += 1
+
+    def put_links(self, heap_node, dll_elem):
+        pos = dll_elem.pos
+        if pos in self.elems:
+            node, elem, page = self.elems[pos]
+            elem.prev = dll_elem.prev
+            elem.succ = dll_elem.succ
+            page.prev = dll_elem.prev
+            page.succ = dll_elem.succ
+        else:
+            self.links[pos] = (copy.copy(heap_node), copy.copy(dll_elem))
+        self.writes += 1
+
+    def get(self, pos):
+        """a copy of the element at pos, or None if not held"""
+        if pos not in self.elems:
+            return None
+        node, elem, page = self.elems[pos]
+        nodelist = NodeList()
+        nodelist.parent = page.parent
+        for n in page.nodes():
+            nodelist.insert(n)
+        return BTreeElement(copy.copy(node), copy.copy(elem), nodelist)
+
+    def get_links(self, pos):
+        """copies of the heap node and dll element at pos, or None"""
+        if pos in self.elems:
+            node, elem, page = self.elems[pos]
+        elif pos in self.links:
+            node, elem = self.links[pos]
+        else:
+            return None
+        return copy.copy(node), copy.copy(elem)
+
+    def free(self, btelem):
+        pos = btelem.elem.pos
+        self.elems.pop(pos, None)
+        self.links.pop(pos, None)
+        self.freed[pos] = (btelem.node, btelem.elem.data)
+
+    def due(self):
+        if len(self) >= self.max_elems:
+            return True
+        if self.interval != None and len(self) > 0:
+            return time.monotonic() - self.last >= self.interval
+        return False
+
+    def checkpoint(self):
+        bpt = self.bpt
+        for pos in sorted(self.elems.keys()):
+            bpt._write_elem_disk(self.get(pos))
+        for pos in sorted(self.links.keys()):
+            bpt.btcore.fd.write_elem(*self.links[pos])
+        for pos in sorted(self.freed.keys()):
+            bpt._free_elem_disk(*self.freed[pos])
+        if self.header == True:
+            bpt._write_header_disk()
+        self.elems = {}
+        self.links = {}
+        self.freed = {}
+        self.header = False
+        self.checkpoints += 1
+        self.last = time.monotonic()
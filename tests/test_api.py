@@ -0,0 +1,1161 @@
+import unittest
+import random
+import io
+import time
+
+from pybtreeplus.bptree import HeapFile, BPlusTree, BTreeCoreFile, Node, NodeList
+from pybtreeplus.bptree import Context
+from pybtreeplus.btcompact import CompactElement
+from pybtreeplus.durability import DURABILITY_NONE, DURABILITY_FLUSH
+from pybtreeplus.durability import DURABILITY_FSYNC, DURABILITY_GROUP
+from pybtreeplus.codec import ZlibCodec, LzmaCodec
+from pybtreeplus.codec import is_packed, is_paged, read_stub, CODEC_MAGIC
+from pybtreeplus.btheap import read_page
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+def _scan_keys(nodes):
+    return list(map(lambda x: x.key, nodes))
+
+
+class BTreePlusApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.para = self._create_heap()
+
+    def tearDown(self):
+        hpf, btcore, bpt, node0, root = self.para
+        hpf.write_node(node0, bpt.to_bytes())
+        print("b+tree", bpt)
+        print("-" * 37)
+        hpf.close()
+
+    # helper
+
+    def _create_heap(self):
+        hpf = HeapFile(fnam).create()
+        hpf.close()
+
+        hpf = HeapFile(fnam).open()
+
+        node0 = hpf.alloc(0x50, data="not empty first node".encode())
+        self.assertNotEqual(node0, None)
+
+        btcore = BTreeCoreFile(hpf)  # , keys_per_node=3)
+
+        conv_key = ConvertStr()
+        conv_data = ConvertInteger()
+
+        bpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=conv_data)
+
+        root = bpt.create_new()
+
+        return hpf, btcore, bpt, node0, root
+
+    def _test_data(self, i, mult=10, offs=0):
+        return "hello" + str(i * mult + offs).zfill(5), i
+
+    def _insert(self, elems, mult=10):
+        hpf, btcore, bpt, node0, root = self.para
+
+        samples = []
+        for i in elems:
+            ntxt, ndat = self._test_data(i, mult=mult)
+            samples.append((ntxt, ndat))
+
+            _, i_btelem, rc, ctx = bpt.search_node(ntxt)
+            self.assertFalse(rc, [ntxt, rc])
+
+            n = Node(key=ntxt, data=ndat)
+            n, cngbtelem, rc = bpt.insert_2_leaf(n, i_btelem, ctx=ctx)
+            self.assertTrue(rc, [ntxt, n, cngbtelem])
+
+        return samples
+
+    # tests
+
+    def test_0000_get_many(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        samples = self._insert(elems)
+
+        random.shuffle(samples)
+        keys = [key for key, data in samples]
+        # missing keys in between, and duplicates
+        keys.extend([self._test_data(i, offs=5)[0] for i in range(0, 20)])
+        keys.extend(keys[:10])
+
+        nodes = bpt.get_many(keys)
+        self.assertEqual(len(nodes), len(keys))
+
+        expected = dict(samples)
+        for key, n in zip(keys, nodes):
+            if key in expected:
+                self.assertNotEqual(n, None, key)
+                self.assertEqual(n.key, key)
+                self.assertEqual(n.data, expected[key])
+            else:
+                self.assertEqual(n, None, key)
+
+    def test_0010_get_many_empty(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        self.assertEqual(bpt.get_many([]), [])
+        self.assertEqual(bpt.get_many(["hello"]), [None])
+
+    def _iter_elems(self, bpt):
+        """all elements of the tree, from the root down"""
+        pending = [bpt.root_pos]
+        while len(pending) > 0:
+            btelem = bpt._read_elem(pending.pop(0))
+            yield btelem
+            for n in btelem.nodelist:
+                pending.extend(filter(lambda x: x > 0, [n.left, n.right]))
+
+    def _child_pos(self, nodelist, key):
+        for n in nodelist:
+            if key <= n.key:
+                return n.left
+        return nodelist[-1].right
+
+    def test_0050_compact_element(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        self._insert(elems, mult=20)
+
+        leafs = 0
+        inner = 0
+        for btelem in self._iter_elems(bpt):
+            nodelist = btelem.nodelist
+            page = CompactElement.from_btelem(btelem)
+            self.assertEqual(page.pos, btelem.elem.pos)
+            self.assertEqual(page.parent, nodelist.parent)
+            self.assertEqual(page.keys, _scan_keys(nodelist))
+            self.assertEqual(page.leaf, nodelist[0].leaf)
+
+            for n, cn in zip(nodelist, page.nodes()):
+                self.assertEqual(
+                    [cn.key, cn.data, cn.left, cn.right],
+                    [n.key, n.data, n.left, n.right],
+                )
+
+            # the keys, between them, and beyond both ends
+            probes = []
+            for key in page.keys:
+                probes.extend([key, key + "0", key[:-1]])
+            probes.extend(["", "hello99999"])
+
+            if page.leaf == True:
+                leafs += 1
+                self.assertEqual(page.prev, btelem.elem.prev)
+                self.assertEqual(page.succ, btelem.elem.succ)
+                for key in probes:
+                    self.assertEqual(page.find_key(key), nodelist.find_key(key), key)
+            else:
+                inner += 1
+                for key in probes:
+                    self.assertEqual(
+                        page.child_pos(key), self._child_pos(nodelist, key), key
+                    )
+                self.assertEqual(page.child_pos("hello99999"), nodelist[-1].right)
+        self.assertTrue(leafs > 1)
+        self.assertTrue(inner > 0)
+
+        # no right link, no child beyond the last key
+        page = CompactElement(leaf=False)
+        page.keys, page.lefts, page.rights = ["b", "d"], [0x10, 0x20], [0, 0]
+        self.assertEqual(page.child_pos("a"), 0x10)
+        self.assertEqual(page.child_pos("d"), 0x20)
+        self.assertEqual(page.child_pos("e"), 0)
+
+    def test_0060_compact_context(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 4))
+        self._insert(elems)
+
+        # inner elements stay compact, leafs are kept in full for changes
+        ctx = Context(bpt)
+        page = ctx._read_compact(bpt.root_pos)
+        self.assertFalse(page.leaf)
+        self.assertTrue(bpt.root_pos in ctx.pages)
+        self.assertFalse(bpt.root_pos in ctx.elems)
+
+        leaf_pos = page.child_pos(self._test_data(0)[0])
+        leaf = ctx._read_compact(leaf_pos)
+        self.assertTrue(leaf.leaf)
+        self.assertTrue(leaf_pos in ctx.elems)
+        self.assertFalse(leaf_pos in ctx.pages)
+
+        # changes in the context are seen in compact form
+        btelem = ctx._read_elem(leaf_pos)
+        btelem.nodelist[0].data = -1
+        ctx._write_elem(btelem)
+        self.assertEqual(ctx._read_compact(leaf_pos).data[0], -1)
+
+        n, btelem, rc, ctx = bpt.search_node(self._test_data(0)[0], ctx=ctx)
+        self.assertEqual(n.data, -1)
+        self.assertEqual(ctx.path, [bpt.root_pos, leaf_pos])
+        ctx.abort()
+
+        # searching keeps the inner elements read in full, for a split
+        n, btelem, rc, ctx = bpt.search_node(self._test_data(0)[0])
+        self.assertEqual(n.data, 0)
+        self.assertTrue(bpt.root_pos in ctx._decoded)
+        self.assertTrue(bpt.root_pos in ctx.pages)
+
+    def test_0100_put(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        maxn = btcore.keys_per_node * 4
+        for i in range(0, maxn):
+            key, data = self._test_data(i)
+            n = bpt.put(key, data)
+            self.assertEqual(n.key, key)
+
+        for i in range(0, maxn):
+            key, data = self._test_data(i)
+            bpt.put(key, data * 2)
+
+        cnt = 0
+        for n in bpt.iter_first():
+            self.assertEqual(self._test_data(cnt)[1] * 2, n.data)
+            cnt += 1
+        self.assertEqual(cnt, maxn)
+
+    def test_0110_setdefault(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        self.assertEqual(bpt.setdefault("hello", 1), 1)
+        self.assertEqual(bpt.setdefault("hello", 2), 1)
+
+        node, btelem, rc, ctx = bpt.search_node("hello")
+        self.assertTrue(rc)
+        self.assertEqual(node.data, 1)
+
+    def test_0120_update_if(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        self.assertFalse(bpt.update_if("hello", None, 1))
+        bpt.put("hello", 1)
+        self.assertFalse(bpt.update_if("hello", 2, 3))
+        self.assertTrue(bpt.update_if("hello", 1, 3))
+
+        node, btelem, rc, ctx = bpt.search_node("hello")
+        self.assertTrue(rc)
+        self.assertEqual(node.data, 3)
+
+    def test_0130_increment(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        keys = [self._test_data(i)[0] for i in range(0, btcore.keys_per_node * 2)]
+        for r in range(0, 3):
+            random.shuffle(keys)
+            for key in keys:
+                bpt.increment(key, 2)
+
+        for n in bpt.iter_first():
+            self.assertEqual(n.data, 6)
+
+    def test_0200_codec(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        for codec in [ZlibCodec(), LzmaCodec()]:
+            cbpt = BPlusTree(
+                btcore=btcore,
+                conv_key=bpt.conv_key,
+                conv_data=bpt.conv_data,
+                codec=codec,
+            )
+            cbpt.create_new()
+
+            elems = list(range(0, btcore.keys_per_node * 4))
+            random.shuffle(elems)
+            for i in elems:
+                cbpt.put(*self._test_data(i))
+
+            cnt = 0
+            for n in cbpt.iter_first():
+                self.assertEqual(n.key, self._test_data(cnt)[0])
+                self.assertEqual(n.data, cnt)
+                cnt += 1
+            self.assertEqual(cnt, len(elems))
+
+            # inner elements compressed in place, leafs in a page of their own
+            heap_node, dll_elem = btcore.fd.read_elem(cbpt.root_pos)
+            self.assertTrue(is_packed(dll_elem.data))
+            for btelem in cbpt.iter_elem_first():
+                heap_node, dll_elem = btcore.fd.read_elem(btelem.elem.pos)
+                self.assertTrue(is_paged(dll_elem.data))
+                page_pos, size = read_stub(dll_elem.data, cbpt.link_size)
+                node, buf = read_page(btcore.heap_fd, page_pos)
+                self.assertTrue(is_packed(buf))
+                self.assertTrue(len(buf) <= size)
+                self.assertEqual(buf[len(CODEC_MAGIC)], codec.codec_id)
+
+            # one read per level
+            reads = []
+            read_elem = btcore.fd.read_elem
+
+            def _read_elem(pos):
+                reads.append(pos)
+                return read_elem(pos)
+
+            btcore.fd.read_elem = _read_elem
+            n, btelem, rc, ctx = cbpt.search_node(self._test_data(elems[0])[0])
+            self.assertTrue(rc)
+            self.assertEqual(len(reads), len(set(reads)))
+            self.assertEqual(reads[0], cbpt.root_pos)
+            self.assertEqual(reads[-1], btelem.elem.pos)
+            del btcore.fd.read_elem
+
+            # pages freed together with their leafs
+            for i in elems:
+                key = self._test_data(i)[0]
+                n, btelem, rc, ctx = cbpt.search_node(key)
+                cbpt.delete_from_leaf(key, btelem, ctx=ctx)
+            self.assertEqual(len(list(cbpt.iter_first())), 0)
+
+    def test_0300_create_open(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        fnam2 = "mytest2.hpf"
+
+        obpt = BPlusTree.create(
+            fnam2, conv_key=ConvertStr(), conv_data=ConvertInteger(), codec=ZlibCodec()
+        )
+        header_pos = obpt.header_pos
+
+        maxn = obpt.btcore.keys_per_node * 4
+        for i in range(0, maxn):
+            obpt.put(*self._test_data(i))
+        root_pos = obpt.root_pos
+        obpt.close()
+
+        obpt = BPlusTree.open(
+            fnam2, header_pos, conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        self.assertEqual(obpt.root_pos, root_pos)
+        self.assertEqual(obpt.count, maxn)
+        self.assertEqual(obpt.codec.codec_id, ZlibCodec.codec_id)
+
+        keys = [self._test_data(i)[0] for i in range(0, maxn)]
+        nodes = obpt.get_many(keys)
+        self.assertEqual([n.data for n in nodes], list(range(0, maxn)))
+        obpt.close()
+
+    def test_0400_context_abort(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        maxn = btcore.keys_per_node * 2
+        with Context(bpt) as ctx:
+            for i in range(0, maxn):
+                bpt.put(*self._test_data(i), ctx=ctx, ctx_close=False)
+
+        state = (bpt.root_pos, bpt.first_pos, bpt.last_pos, bpt.count)
+
+        with self.assertRaises(Exception):
+            with Context(bpt) as ctx:
+                for i in range(maxn, maxn * 4):
+                    bpt.put(*self._test_data(i), ctx=ctx, ctx_close=False)
+                raise Exception("abort")
+
+        self.assertEqual(state, (bpt.root_pos, bpt.first_pos, bpt.last_pos, bpt.count))
+
+        cnt = 0
+        for n in bpt.iter_first():
+            self.assertEqual(n.key, self._test_data(cnt)[0])
+            cnt += 1
+        self.assertEqual(cnt, maxn)
+
+        # the tree is usable after abort
+        bpt.put(*self._test_data(maxn))
+        self.assertEqual(bpt.count, maxn + 1)
+
+    def test_0410_delete_missing(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        maxn = btcore.keys_per_node * 2
+        for i in range(0, maxn):
+            bpt.put(*self._test_data(i))
+        bpt.enable_bloom()
+
+        # a missing key is not counted as deleted
+        key = self._test_data(maxn)[0]
+        n, btelem, rc, ctx = bpt.search_node(key)
+        self.assertFalse(rc)
+        with self.assertRaises(Exception):
+            bpt.delete_from_leaf(key, btelem)
+        self.assertEqual(bpt.count, maxn)
+        self.assertEqual(bpt.bloom.deleted, 0)
+
+        key = self._test_data(0)[0]
+        n, btelem, rc, ctx = bpt.search_node(key)
+        bpt.delete_from_leaf(key, btelem, ctx=ctx)
+        self.assertEqual(bpt.count, maxn - 1)
+        self.assertEqual(bpt.bloom.deleted, 1)
+        self.assertEqual(bpt.verify().keys, bpt.count)
+
+    def test_0500_verify(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 16))
+        random.shuffle(elems)
+        samples = self._insert(elems)
+
+        verifier = bpt.verify()
+        self.assertTrue(verifier.done)
+        self.assertTrue(verifier.ok, verifier.errors)
+        self.assertEqual(verifier.keys, len(samples))
+
+        verifier = bpt.verify(budget=3)
+        self.assertFalse(verifier.done)
+        while verifier.done == False:
+            bpt.verify(budget=3, verifier=verifier)
+        self.assertTrue(verifier.ok, verifier.errors)
+        self.assertEqual(verifier.keys, len(samples))
+
+        parts = bpt.verify(budget=0).partition()
+        self.assertTrue(len(parts) > 1)
+        for part in parts:
+            part.run()
+            self.assertTrue(part.ok, part.errors)
+        self.assertEqual(sum(map(lambda x: x.keys, parts)), len(samples))
+
+        verifier = bpt.verify(sample=0.3)
+        self.assertTrue(verifier.ok, verifier.errors)
+        self.assertTrue(verifier.keys < len(samples))
+
+        first_pos = bpt.first_pos
+        bpt.first_pos = bpt.last_pos
+        verifier = bpt.verify()
+        bpt.first_pos = first_pos
+        self.assertFalse(verifier.ok)
+
+    def test_0510_verify_fill(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        # the partial rightmost elements of a bulk load are fine
+        items = [self._test_data(i) for i in range(0, btcore.keys_per_node * 10 + 1)]
+        bpt.bulk_load(items)
+        self.assertTrue(bpt.verify().ok)
+
+        # a leaf emptied without rebalance is not
+        ctx = Context(bpt)
+        btelem = ctx._read_elem(bpt.first_pos)
+        while len(btelem.nodelist) > 1:
+            btelem.nodelist.pop(-1)
+        ctx._write_elem(btelem)
+        ctx.done()
+
+        verifier = bpt.verify()
+        self.assertFalse(verifier.ok)
+        errors = list(filter(lambda x: x[1] == "underflow", verifier.errors))
+        self.assertEqual(errors, [(bpt.first_pos, "underflow", 1, verifier.min_keys)])
+
+    def test_0600_iter_range(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        samples = self._insert(elems)
+        keys = sorted(map(lambda x: x[0], samples))
+
+        lower, upper = keys[10], keys[-10]
+        found = list(map(lambda x: x.key, bpt.iter_range(lower, upper)))
+        self.assertEqual(found, keys[11:-9])
+
+        found = list(map(lambda x: x.key, bpt.iter_range()))
+        self.assertEqual(found, keys)
+
+    def test_0610_parallel_scan(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        samples = self._insert(elems)
+        keys = sorted(map(lambda x: x[0], samples))
+
+        results = bpt.parallel_scan(_scan_keys, workers=2, path=fnam)
+        self.assertTrue(len(results) > 1)
+        self.assertEqual([key for part in results for key in part], keys)
+
+        results = bpt.parallel_scan(_scan_keys, workers=2, ordered=False, path=fnam)
+        self.assertEqual(sorted([key for part in results for key in part]), keys)
+
+    def _bulk_tree(self):
+        hpf, btcore, bpt, node0, root = self.para
+        nbpt = BPlusTree(btcore=btcore, conv_key=bpt.conv_key, conv_data=bpt.conv_data)
+        nbpt.create_new()
+        return nbpt
+
+    def test_0700_bulk_load(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        kpn = btcore.keys_per_node
+        fill = int(kpn * 0.9)
+        for cnt in [1, 2, fill - 1, fill, fill + 1, fill * fill, fill * fill + 1]:
+            nbpt = self._bulk_tree()
+            samples = [self._test_data(i) for i in range(0, cnt)]
+            self.assertEqual(nbpt.bulk_load(samples), cnt)
+            self.assertEqual(nbpt.count, cnt)
+
+            self.assertTrue(nbpt.verify().ok, nbpt.verify().errors)
+            self.assertEqual(
+                list(map(lambda x: x.key, nbpt.iter_first())),
+                [key for key, data in samples],
+            )
+            self.assertEqual(
+                list(map(lambda x: x.key, nbpt.iter_last())),
+                list(reversed([key for key, data in samples])),
+            )
+            for key, data in samples:
+                n, _, rc, ctx = nbpt.search_node(key)
+                self.assertTrue(rc, key)
+                self.assertEqual(n.data, data)
+
+        with self.assertRaises(Exception):
+            nbpt.bulk_load([self._test_data(cnt)])
+
+        nbpt = self._bulk_tree()
+        self.assertEqual(nbpt.bulk_load([]), 0)
+        with self.assertRaises(Exception):
+            nbpt.bulk_load([self._test_data(1), self._test_data(0)])
+
+    def test_0710_bulk_load_modify(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+
+        random.shuffle(elems)
+        # keys in between the loaded ones
+        for i in elems[: len(elems) // 2]:
+            bpt.put(*self._test_data(i, mult=20, offs=1))
+        self.assertTrue(bpt.verify().ok, bpt.verify().errors)
+        self.assertEqual(bpt.count, len(elems) * 3 // 2)
+
+        keys = list(map(lambda x: x.key, bpt.iter_first()))
+        self.assertEqual(keys, sorted(keys))
+
+    def test_0720_dump_load(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        samples = sorted(self._insert(elems))
+
+        fd = io.BytesIO()
+        self.assertEqual(bpt.dump(fd), len(samples))
+
+        fd.seek(0)
+        nbpt = self._bulk_tree()
+        self.assertEqual(nbpt.load(fd), len(samples))
+        self.assertTrue(nbpt.verify().ok, nbpt.verify().errors)
+        self.assertEqual(
+            list(map(lambda x: (x.key, x.data), nbpt.iter_first())), samples
+        )
+
+        fd = io.BytesIO(fd.getvalue()[:-3])
+        with self.assertRaises(Exception):
+            self._bulk_tree().load(fd)
+
+    def test_0800_set_operations(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        kpn = btcore.keys_per_node
+        # dense range, and a sparse one with large gaps in between
+        lkeys = list(range(0, kpn * 20))
+        rkeys = list(range(kpn * 5, kpn * 6)) + list(range(0, kpn * 30, kpn * 3 + 1))
+        rkeys = sorted(set(rkeys))
+
+        bpt.bulk_load([self._test_data(i) for i in lkeys])
+        other = self._bulk_tree()
+        other.bulk_load([self._test_data(i) for i in rkeys])
+        # data differs for keys in both trees
+        for i in rkeys:
+            other.put(self._test_data(i)[0], -i)
+
+        lset = set(self._test_data(i)[0] for i in lkeys)
+        rset = set(self._test_data(i)[0] for i in rkeys)
+
+        pairs = list(bpt.merge_join(other))
+        self.assertEqual([a.key for a, b in pairs], sorted(lset & rset))
+        self.assertTrue(all(map(lambda x: x[0].data == -x[1].data, pairs)))
+
+        found = list(map(lambda x: x.key, bpt.intersect(other)))
+        self.assertEqual(found, sorted(lset & rset))
+        found = list(map(lambda x: x.key, other.intersect(bpt)))
+        self.assertEqual(found, sorted(lset & rset))
+
+        found = list(map(lambda x: x.key, bpt.difference(other)))
+        self.assertEqual(found, sorted(lset - rset))
+        found = list(map(lambda x: x.key, other.difference(bpt)))
+        self.assertEqual(found, sorted(rset - lset))
+
+        found = list(bpt.union(other))
+        self.assertEqual(list(map(lambda x: x.key, found)), sorted(lset | rset))
+        self.assertTrue(all(map(lambda x: x.data >= 0 or x.key not in lset, found)))
+
+        empty = self._bulk_tree()
+        self.assertEqual(list(bpt.intersect(empty)), [])
+        self.assertEqual(len(list(bpt.difference(empty))), len(lkeys))
+        self.assertEqual(len(list(empty.union(bpt))), len(lkeys))
+
+    def test_0900_cursor(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i) for i in elems])
+        keys = [self._test_data(i)[0] for i in elems]
+
+        cur = bpt.cursor()
+        self.assertTrue(cur.first())
+        found = [cur.key]
+        while cur.next():
+            found.append(cur.key)
+        self.assertEqual(found, keys)
+        self.assertFalse(cur.valid)
+        # moves back from behind the last key
+        self.assertTrue(cur.prev())
+        self.assertEqual(cur.key, keys[-1])
+
+        self.assertTrue(cur.last())
+        found = [cur.key]
+        while cur.prev():
+            found.append(cur.key)
+        self.assertEqual(found, list(reversed(keys)))
+        self.assertTrue(cur.next())
+        self.assertEqual(cur.key, keys[0])
+
+        # seek forward along the leaf chain, and backward from the root
+        for i in [5, 6, 40, 200, 3, 0, len(keys) - 1]:
+            self.assertTrue(cur.seek(keys[i]))
+            self.assertEqual(cur.key, keys[i])
+            self.assertEqual(cur.data, i)
+        # between keys, and behind the last key
+        self.assertTrue(cur.seek(self._test_data(7, offs=5)[0]))
+        self.assertEqual(cur.key, keys[8])
+        self.assertFalse(cur.seek(self._test_data(len(keys))[0]))
+        self.assertTrue(cur.seek(""))
+        self.assertEqual(cur.key, keys[0])
+
+        self.assertEqual(list(map(lambda x: x.key, bpt.cursor())), keys)
+
+    def test_0910_cursor_modified(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i) for i in elems])
+        keys = [self._test_data(i)[0] for i in elems]
+
+        cur = bpt.cursor()
+        cur.seek(keys[100])
+        version = bpt.leaf_version(cur.page.pos)
+
+        # the key at the cursor is deleted, the cursor moves on
+        n, btelem, rc, ctx = bpt.search_node(keys[100])
+        bpt.delete_from_leaf(keys[100], btelem, ctx=ctx)
+        self.assertNotEqual(bpt.leaf_version(cur.page.pos), version)
+        self.assertTrue(cur.next())
+        self.assertEqual(cur.key, keys[101])
+
+        # a key is inserted in front of the cursor
+        bpt.put(self._test_data(101, offs=5)[0], -1)
+        self.assertTrue(cur.next())
+        self.assertEqual(cur.key, self._test_data(101, offs=5)[0])
+        self.assertTrue(cur.prev())
+        self.assertEqual(cur.key, keys[101])
+
+        # many inserts split the leaf at the cursor
+        for i in elems[101:200]:
+            bpt.put(self._test_data(i, offs=3)[0], i)
+        self.assertTrue(cur.prev())
+        self.assertEqual(cur.key, keys[99])
+        self.assertTrue(cur.next())
+        self.assertEqual(cur.key, keys[101])
+        self.assertTrue(cur.next())
+        self.assertEqual(cur.key, self._test_data(101, offs=3)[0])
+
+    def test_1000_search_path(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * btcore.keys_per_node))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+
+        key, data = self._test_data(100, mult=20)
+        n, btelem, rc, ctx = bpt.search_node(key)
+        self.assertTrue(rc)
+        self.assertTrue(len(ctx.path) > 2)
+        self.assertEqual(ctx.path[0], bpt.root_pos)
+        self.assertEqual(ctx.path[-1], btelem.elem.pos)
+        self.assertEqual(ctx.path[-2], btelem.nodelist.parent)
+
+        # the same context is reused for inserts splitting the path
+        for i in range(100, 100 + btcore.keys_per_node):
+            key, data = self._test_data(i, mult=20, offs=1)
+            n, btelem, rc, ctx = bpt.search_node(key, ctx=ctx)
+            self.assertFalse(rc)
+            bpt.insert_2_leaf(
+                Node(key=key, data=data), btelem, ctx=ctx, ctx_close=False
+            )
+        ctx.done()
+
+        self.assertTrue(bpt.verify().ok, bpt.verify().errors)
+        self.assertEqual(bpt.count, len(elems) + btcore.keys_per_node)
+
+    def test_1100_write_order(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+
+        written = []
+        write_elem = bpt._write_elem
+
+        def _write_elem(btelem):
+            written.append(btelem.elem.pos)
+            return write_elem(btelem)
+
+        bpt._write_elem = _write_elem
+
+        ctx = Context(bpt)
+        for i in reversed(elems):
+            key, data = self._test_data(i, mult=20, offs=1)
+            bpt.put(key, data, ctx=ctx, ctx_close=False)
+        ctx.done()
+
+        self.assertTrue(len(written) > 1)
+        self.assertEqual(written, sorted(set(written)))
+        self.assertTrue(bpt.verify().ok, bpt.verify().errors)
+
+    def test_1200_link_update(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+
+        key, data = self._test_data(100, mult=20)
+        n, btelem, rc, ctx = bpt.search_node(key)
+        neighbours = [btelem.elem.prev, btelem.elem.succ]
+        self.assertTrue(0 not in neighbours)
+        # keys in between the keys of the leaf stay in the leaf
+        keys = list(map(lambda x: x.key + "x", btelem.nodelist))[:-1]
+
+        read = []
+        read_elem = bpt._read_elem
+
+        def _read_elem(pos):
+            read.append(pos)
+            return read_elem(pos)
+
+        bpt._read_elem = _read_elem
+
+        # split the leaf, the neighbours only get new links
+        with Context(bpt) as ctx:
+            for key in keys:
+                bpt.put(key, 1, ctx=ctx, ctx_close=False)
+        self.assertEqual(list(filter(lambda x: x in neighbours, read)), [])
+
+        self.assertTrue(bpt.verify().ok, bpt.verify().errors)
+        found = list(map(lambda x: x.key, bpt.iter_first()))
+        self.assertEqual(found, sorted(found))
+        found = list(map(lambda x: x.key, bpt.iter_last()))
+        self.assertEqual(found, sorted(found, reverse=True))
+
+    def test_1300_bloom(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        samples = self._insert(elems[: len(elems) // 2], mult=20)
+        bpt.enable_bloom(fp_rate=0.01)
+        # maintained on insert
+        for i in elems[len(elems) // 2 :]:
+            bpt.put(*self._test_data(i, mult=20))
+
+        for i in elems:
+            self.assertTrue(bpt.contains(self._test_data(i, mult=20)[0]))
+
+        misses = [self._test_data(i, mult=20, offs=1)[0] for i in elems]
+        passed = list(filter(lambda x: bpt._bloom_key(x) in bpt.bloom, misses))
+        self.assertTrue(len(passed) < len(misses) // 10, len(passed))
+        self.assertFalse(any(map(bpt.contains, misses)))
+
+        keys = [self._test_data(i, mult=20)[0] for i in elems[:10]] + misses[:10]
+        found = bpt.get_many(keys)
+        self.assertEqual(
+            list(map(lambda x: x != None, found)), [True] * 10 + [False] * 10
+        )
+
+        # rebuilt after many deletes, deleted keys then miss again
+        bloom = bpt.bloom
+        for i in elems[: len(elems) // 2]:
+            key = self._test_data(i, mult=20)[0]
+            n, btelem, rc, ctx = bpt.search_node(key)
+            bpt.delete_from_leaf(key, btelem, ctx=ctx)
+        self.assertNotEqual(bpt.bloom, bloom)
+        self.assertTrue(bpt.bloom.deleted < len(elems) // 2)
+        for i in elems:
+            key = self._test_data(i, mult=20)[0]
+            self.assertEqual(bpt.contains(key), i >= len(elems) // 2)
+
+    def test_1310_bloom_persistent(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        path = "mytest_bloom.hpf"
+        nbpt = BPlusTree.create(path, conv_key=ConvertStr(), conv_data=ConvertInteger())
+        header_pos = nbpt.header_pos
+        nbpt.enable_bloom(max_bytes=0x100)
+        self.assertEqual(len(nbpt.bloom.bits), 0x100)
+        elems = list(range(0, btcore.keys_per_node * 4))
+        for i in elems:
+            nbpt.put(*self._test_data(i))
+        nbpt.close()
+
+        nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+        self.assertNotEqual(nbpt.bloom, None)
+        self.assertFalse(nbpt.bloom.dirty)
+        self.assertTrue(nbpt.contains(self._test_data(0)[0]))
+
+        # changes not followed by close() make the filter rebuild on open
+        nbpt.put(*self._test_data(len(elems)))
+        nbpt._flush()
+        nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+        self.assertTrue(nbpt.bloom.dirty)
+        self.assertTrue(nbpt.contains(self._test_data(len(elems))[0]))
+        self.assertEqual(len(nbpt.bloom.bits), 0x100)
+
+        nbpt.disable_bloom()
+        nbpt.close()
+        nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+        self.assertEqual(nbpt.bloom, None)
+        nbpt.close()
+
+    def test_1320_bloom_header_first(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        path = "mytest_bloom.hpf"
+        nbpt = BPlusTree.create(path, conv_key=ConvertStr(), conv_data=ConvertInteger())
+        header_pos = nbpt.header_pos
+        nbpt.enable_bloom()
+        elems = list(range(0, btcore.keys_per_node * 4))
+        for i in elems:
+            nbpt.put(*self._test_data(i))
+        nbpt.write_bloom()
+
+        # the header stops marking the filter current before any changed
+        # element is written, a crash in between rebuilds it on open
+        marks = []
+        write_list = nbpt.btcore.write_list
+
+        def _write_list(btelem, **kwargs):
+            buf = read_page(nbpt.btcore.heap_fd, header_pos)[1]
+            # the mark in front of keys_per_node and codec id
+            marks.append(buf[-9])
+            return write_list(btelem, **kwargs)
+
+        nbpt.btcore.write_list = _write_list
+        nbpt.put(*self._test_data(len(elems)))
+        self.assertEqual(len(marks), 1)
+        nbpt.write_bloom()
+        # with write back the elements are written at the checkpoint
+        nbpt.enable_write_back()
+        nbpt.put(*self._test_data(len(elems) + 1))
+        nbpt.checkpoint()
+        del nbpt.btcore.write_list
+
+        self.assertEqual(len(marks), 2)
+        self.assertEqual(marks, [0] * len(marks))
+        nbpt.close()
+
+    def test_1330_bloom_count_unknown(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 16))
+        self._insert(elems)
+
+        # a tree restored from its links has no count,
+        # the filter is sized for the keys found
+        nbpt = BPlusTree(btcore, conv_key=bpt.conv_key, conv_data=bpt.conv_data)
+        nbpt.from_bytes(bpt.to_bytes())
+        self.assertEqual(nbpt.count, 0)
+        nbpt.enable_bloom()
+        self.assertEqual(nbpt.bloom.added, len(elems))
+        self.assertTrue(nbpt.bloom.capacity >= len(elems))
+        self.assertFalse(nbpt.bloom.stale())
+
+        # and not rebuilt with every change
+        bloom = nbpt.bloom
+        for i in range(len(elems), len(elems) + 10):
+            nbpt.put(*self._test_data(i))
+        self.assertTrue(nbpt.bloom is bloom)
+        self.assertTrue(nbpt.contains(self._test_data(len(elems))[0]))
+
+    def test_1400_hash_index(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+        hidx = bpt.enable_hash_index(max_keys=8, hot=2)
+
+        hot = [self._test_data(i, mult=20)[0] for i in [3, 100, 101, 200]]
+        for i in range(0, 3):
+            for key in hot:
+                n, btelem, rc, ctx = bpt.search_node(key)
+                self.assertTrue(rc)
+                self.assertEqual(n.key, key)
+        self.assertEqual(len(hidx), len(hot))
+        self.assertEqual(hidx.hits, len(hot))
+
+        # served from the index, without descent
+        n, btelem, rc, ctx = bpt.search_node(hot[1])
+        self.assertTrue(rc)
+        self.assertEqual(ctx.path, [btelem.elem.pos])
+
+        # a split of the leaf drops its keys, changed leafs are not used
+        with Context(bpt) as ctx:
+            for i in range(100, 100 + btcore.keys_per_node):
+                key, data = self._test_data(i, mult=20, offs=1)
+                bpt.put(key, data, ctx=ctx, ctx_close=False)
+        self.assertTrue(hot[1] not in hidx.index)
+        for key in hot:
+            n, btelem, rc, ctx = bpt.search_node(key)
+            self.assertTrue(rc)
+            self.assertEqual(n.key, key)
+
+        # deleted keys are not found through the index
+        n, btelem, rc, ctx = bpt.search_node(hot[0])
+        bpt.delete_from_leaf(hot[0], btelem, ctx=ctx)
+        n, btelem, rc, ctx = bpt.search_node(hot[0])
+        self.assertFalse(rc)
+
+        # bounded
+        for i in elems:
+            for j in range(0, 2):
+                bpt.search_node(self._test_data(i, mult=20)[0])
+        self.assertEqual(len(hidx), 8)
+        self.assertTrue(bpt.verify().ok)
+
+    def test_1410_hash_index_after_writes(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+        hidx = bpt.enable_hash_index(hot=1)
+
+        key = self._test_data(3, mult=20)[0]
+        n, btelem, rc, ctx = bpt.search_node(key)
+        leaf_pos = btelem.elem.pos
+        self.assertTrue(key in hidx.index)
+
+        # a write to the sibling leaf keeps the entry
+        sibling = bpt._read_elem(btelem.elem.succ)
+        other = sibling.nodelist[0].key
+        bpt.put(other, -1)
+        hits = hidx.hits
+        n, btelem, rc, ctx = bpt.search_node(key)
+        self.assertTrue(rc)
+        self.assertEqual(hidx.hits, hits + 1)
+        self.assertEqual(ctx.path, [leaf_pos])
+
+        # a write to the leaf itself drops it
+        bpt.put(self._test_data(4, mult=20)[0], -1)
+        misses = hidx.misses
+        n, btelem, rc, ctx = bpt.search_node(key)
+        self.assertTrue(rc)
+        self.assertEqual(hidx.misses, misses + 1)
+        self.assertEqual(ctx.path[0], bpt.root_pos)
+        self.assertEqual(btelem.elem.pos, leaf_pos)
+
+    def _check_pinned(self, bpt):
+        for pos, page in bpt.pinned.items():
+            btelem = bpt._read_elem(pos)
+            self.assertEqual(page.keys, list(map(lambda x: x.key, btelem.nodelist)))
+            page2 = CompactElement.from_btelem(btelem)
+            self.assertEqual(page.children(), page2.children())
+
+    def test_1500_pinned_levels(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        kpn = btcore.keys_per_node
+        elems = list(range(0, kpn * kpn * 2))
+        bpt.bulk_load([self._test_data(i, mult=20) for i in elems])
+        bpt.pin_levels(2)
+        self.assertTrue(bpt.root_pos in bpt.pinned)
+        self.assertTrue(len(bpt.pinned) > 1)
+        self._check_pinned(bpt)
+
+        read = []
+        read_elem = bpt._read_elem
+
+        def _read_elem(pos):
+            read.append(pos)
+            return read_elem(pos)
+
+        bpt._read_elem = _read_elem
+
+        # only the leaf is read
+        for i in elems[::97]:
+            read.clear()
+            n, btelem, rc, ctx = bpt.search_node(self._test_data(i, mult=20)[0])
+            self.assertTrue(rc)
+            self.assertEqual(read, [btelem.elem.pos])
+
+        # kept current by inserts splitting elements
+        random.shuffle(elems)
+        with Context(bpt) as ctx:
+            for i in elems[: len(elems) // 2]:
+                key, data = self._test_data(i, mult=20, offs=1)
+                bpt.put(key, data, ctx=ctx, ctx_close=False)
+        self._check_pinned(bpt)
+        self.assertTrue(bpt.verify().ok, bpt.verify().errors)
+
+        for i in elems[: len(elems) // 2 : 97]:
+            read.clear()
+            n, btelem, rc, ctx = bpt.search_node(self._test_data(i, mult=20, offs=1)[0])
+            self.assertTrue(rc)
+            self.assertEqual(read, [btelem.elem.pos])
+
+        bpt.pin_levels(0)
+        self.assertEqual(bpt.pinned, {})
+
+    def test_1510_pinned_levels_grow(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        bpt.pin_levels(2)
+        self.assertEqual(bpt.pinned, {})
+
+        # the root splits, the new root gets pinned
+        elems = list(range(0, btcore.keys_per_node * 4))
+        random.shuffle(elems)
+        for i in elems:
+            bpt.put(*self._test_data(i))
+        self.assertEqual(list(bpt.pinned.keys()), [bpt.root_pos])
+        self._check_pinned(bpt)
+
+    def test_1600_durability(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        with self.assertRaises(Exception):
+            bpt.set_durability(DURABILITY_FSYNC)
+
+        path = "mytest_durability.hpf"
+        for mode in [DURABILITY_NONE, DURABILITY_FLUSH, DURABILITY_FSYNC]:
+            nbpt = BPlusTree.create(
+                path, conv_key=ConvertStr(), conv_data=ConvertInteger()
+            )
+            header_pos = nbpt.header_pos
+            nbpt.set_durability(mode)
+            for i in range(0, btcore.keys_per_node * 2):
+                nbpt.put(*self._test_data(i))
+            nbpt.close()
+
+            nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+            self.assertEqual(nbpt.count, btcore.keys_per_node * 2)
+            nbpt.close()
+
+    def test_1610_group_commit(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        path = "mytest_durability.hpf"
+        nbpt = BPlusTree.create(path, conv_key=ConvertStr(), conv_data=ConvertInteger())
+        nbpt.set_durability(DURABILITY_GROUP, interval_ms=10, max_commits=8)
+        group = nbpt.group_commit
+        for i in range(0, 20):
+            nbpt.put(*self._test_data(i))
+        # every 8 commits at once, the rest in the background
+        self.assertTrue(group.syncs >= 2)
+        time.sleep(0.2)
+        self.assertEqual(group.pending, 0)
+
+        nbpt.put(*self._test_data(20))
+        nbpt.close()
+        self.assertEqual(group.pending, 0)
+        self.assertFalse(group._thread.is_alive())
+
+    def test_1700_write_back(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        path = "mytest_write_back.hpf"
+        nbpt = BPlusTree.create(path, conv_key=ConvertStr(), conv_data=ConvertInteger())
+        header_pos = nbpt.header_pos
+        nbpt.enable_write_back(max_elems=0x10000, interval_ms=None)
+        wb = nbpt.write_back
+
+        disk_writes = []
+        write_elem_disk = nbpt._write_elem_disk
+
+        def _write_elem_disk(btelem):
+            disk_writes.append(btelem.elem.pos)
+            return write_elem_disk(btelem)
+
+        nbpt._write_elem_disk = _write_elem_disk
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        for i in elems:
+            nbpt.put(*self._test_data(i))
+        # all held in memory, and visible
+        self.assertEqual(len(disk_writes), 0)
+        self.assertEqual(wb.checkpoints, 0)
+        for i in elems:
+            key, data = self._test_data(i)
+            n, btelem, rc, ctx = nbpt.search_node(key)
+            self.assertEqual(n.data, data)
+
+        half = elems[: len(elems) // 2]
+        for i in half:
+            key = self._test_data(i)[0]
+            n, btelem, rc, ctx = nbpt.search_node(key)
+            nbpt.delete_from_leaf(key, btelem, ctx=ctx)
+        self.assertEqual(len(disk_writes), 0)
+        self.assertTrue(len(wb.freed) > 0)
+
+        # repeated writes of an element are written once
+        nbpt.checkpoint()
+        self.assertEqual(wb.checkpoints, 1)
+        self.assertEqual(len(wb), 0)
+        self.assertEqual(len(disk_writes), len(set(disk_writes)))
+        self.assertTrue(wb.writes > len(disk_writes))
+
+        verifier = nbpt.verify()
+        self.assertTrue(verifier.ok, verifier.errors)
+        self.assertEqual(verifier.keys, len(elems) - len(half))
+        nbpt.close()
+
+        nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+        self.assertEqual(nbpt.count, len(elems) - len(half))
+        for i in elems:
+            self.assertEqual(nbpt.contains(self._test_data(i)[0]), i not in half)
+        nbpt.close()
+
+    def test_1710_write_back_checkpoint_due(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        path = "mytest_write_back.hpf"
+        nbpt = BPlusTree.create(path, conv_key=ConvertStr(), conv_data=ConvertInteger())
+        header_pos = nbpt.header_pos
+        nbpt.enable_write_back(max_elems=4, interval_ms=None)
+        wb = nbpt.write_back
+
+        for i in range(0, btcore.keys_per_node * 4):
+            nbpt.put(*self._test_data(i))
+            self.assertTrue(len(wb) < 4)
+        self.assertTrue(wb.checkpoints > 0)
+
+        # disabling writes what is held
+        checkpoints = wb.checkpoints
+        nbpt.disable_write_back()
+        self.assertEqual(wb.checkpoints, checkpoints + 1)
+        self.assertEqual(nbpt.write_back, None)
+        nbpt.close()
+
+        nbpt = BPlusTree.open(path, header_pos, ConvertStr(), ConvertInteger())
+        self.assertEqual(nbpt.count, btcore.keys_per_node * 4)
+        self.assertTrue(nbpt.verify().ok)
+        nbpt.close()
@@ -0,0 +1,185 @@
+import unittest
+import random
+
+from pybtreeplus.catalog import Catalog
+from pybtreeplus.durability import DURABILITY_FSYNC, DURABILITY_GROUP
+from pybtreeplus.durability import DURABILITY_NONE
+import pybtreeplus.bptree
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+class BTreePlusCatalogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.catalog = Catalog.create(fnam)
+
+    def tearDown(self):
+        print("catalog", self.catalog, self.catalog.cache)
+        print("-" * 37)
+        self.catalog.close()
+
+    # helper
+
+    def _test_data(self, i, mult=10, offs=0):
+        return "hello" + str(i * mult + offs).zfill(5), i
+
+    # tests
+
+    def test_0000_create_and_open(self):
+        catalog = self.catalog
+
+        primary = catalog.create_tree(
+            "primary", conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        second = catalog.create_tree(
+            "second", conv_key=ConvertInteger(), conv_data=ConvertStr()
+        )
+        self.assertEqual(sorted(catalog.names()), ["primary", "second"])
+
+        with self.assertRaises(Exception):
+            catalog.create_tree("primary")
+
+        elems = list(range(0, primary.btcore.keys_per_node * 4))
+        random.shuffle(elems)
+        for i in elems:
+            key, data = self._test_data(i)
+            primary.put(key, data)
+            second.put(data, key)
+
+        catalog_pos = catalog.catalog_pos
+        catalog.close()
+
+        self.catalog = catalog = Catalog.open(fnam, catalog_pos)
+        self.assertTrue("primary" in catalog)
+
+        primary = catalog.tree(
+            "primary", conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        second = catalog.tree(
+            "second", conv_key=ConvertInteger(), conv_data=ConvertStr()
+        )
+        self.assertEqual(primary.count, len(elems))
+        self.assertEqual(second.count, len(elems))
+
+        for n in second.iter_first():
+            node, btelem, rc, ctx = primary.search_node(n.data)
+            self.assertTrue(rc)
+            self.assertEqual(node.data, n.key)
+
+        # the cache is shared and used by both trees
+        nodes = primary.get_many([self._test_data(i)[0] for i in elems])
+        self.assertTrue(len(catalog.cache) > 0)
+        self.assertEqual([n.data for n in nodes], elems)
+
+    def test_0010_transaction(self):
+        catalog = self.catalog
+
+        primary = catalog.create_tree(
+            "primary", conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        second = catalog.create_tree(
+            "second", conv_key=ConvertInteger(), conv_data=ConvertStr()
+        )
+
+        maxn = primary.btcore.keys_per_node * 2
+
+        with catalog.transaction() as tx:
+            for i in range(0, maxn):
+                key, data = self._test_data(i)
+                primary.put(key, data, ctx=tx.ctx(primary), ctx_close=False)
+                second.put(data, key, ctx=tx.ctx(second), ctx_close=False)
+
+        self.assertEqual(primary.count, maxn)
+        self.assertEqual(second.count, maxn)
+
+        root_pos = primary.root_pos
+        with self.assertRaises(Exception):
+            with catalog.transaction("primary", "second") as tx:
+                for i in range(maxn, maxn * 4):
+                    key, data = self._test_data(i)
+                    primary.put(key, data, ctx=tx.ctx(primary), ctx_close=False)
+                    second.put(data, key, ctx=tx.ctx(second), ctx_close=False)
+                raise Exception("abort")
+
+        self.assertEqual(primary.root_pos, root_pos)
+        self.assertEqual(primary.count, maxn)
+        self.assertEqual(second.count, maxn)
+        self.assertEqual(len(list(primary.iter_first())), maxn)
+        self.assertEqual(len(list(second.iter_first())), maxn)
+
+    def test_0020_transaction_durability(self):
+        catalog = self.catalog
+
+        primary = catalog.create_tree(
+            "primary", conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        second = catalog.create_tree(
+            "second", conv_key=ConvertInteger(), conv_data=ConvertStr()
+        )
+        primary.set_durability(DURABILITY_FSYNC)
+        second.set_durability(DURABILITY_GROUP, interval_ms=1000, max_commits=100)
+
+        synced = []
+        fsync_path = pybtreeplus.bptree.fsync_path
+
+        def _fsync_path(path):
+            synced.append(path)
+            fsync_path(path)
+
+        # the fsync of every commit is not deferred by the group commit tree
+        pybtreeplus.bptree.fsync_path = _fsync_path
+        try:
+            for i in range(0, 3):
+                with catalog.transaction("second", "primary") as tx:
+                    key, data = self._test_data(i)
+                    primary.put(key, data, ctx=tx.ctx(primary), ctx_close=False)
+                    second.put(data, key, ctx=tx.ctx(second), ctx_close=False)
+        finally:
+            pybtreeplus.bptree.fsync_path = fsync_path
+
+        self.assertEqual(synced, [fnam] * 3)
+        self.assertEqual(second.group_commit.pending, 0)
+        second.set_durability(DURABILITY_NONE)
+
+    def test_0030_commit_durability(self):
+        catalog = self.catalog
+
+        primary = catalog.create_tree(
+            "primary", conv_key=ConvertStr(), conv_data=ConvertInteger()
+        )
+        second = catalog.create_tree(
+            "second", conv_key=ConvertInteger(), conv_data=ConvertStr()
+        )
+        second.set_durability(DURABILITY_GROUP, interval_ms=1000, max_commits=100)
+        group_commit = second.group_commit
+
+        synced = []
+        fsync_path = pybtreeplus.bptree.fsync_path
+
+        def _fsync_path(path):
+            synced.append(path)
+            fsync_path(path)
+
+        pybtreeplus.bptree.fsync_path = _fsync_path
+        try:
+            # the fsync tree decides for all
+            primary.set_durability(DURABILITY_FSYNC)
+            primary.put(*self._test_data(0))
+            synced.clear()
+            catalog.commit()
+            self.assertEqual(synced, [fnam])
+
+            # the group commit is synced and stopped with close
+            primary.set_durability(DURABILITY_NONE)
+            second.put(0, "hello")
+            catalog.commit()
+            self.assertTrue(group_commit.pending > 0)
+            catalog_pos = catalog.catalog_pos
+            catalog.close()
+            self.assertEqual(group_commit.pending, 0)
+            self.assertFalse(group_commit._thread.is_alive())
+        finally:
+            pybtreeplus.bptree.fsync_path = fsync_path
+
+        self.catalog = Catalog.open(fnam, catalog_pos)
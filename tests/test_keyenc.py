@@ -0,0 +1,176 @@
+import unittest
+import random
+
+from pybtreeplus.bptree import HeapFile, BPlusTree, BTreeCoreFile, Node, NodeList
+from pybtreeplus.keyenc import encode_key, decode_key
+from pybtreeplus.keyenc import ConvertKeyBytes, ConvertOrderedKey, OrderedKey
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+class BTreePlusKeyEncodingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.para = self._create_heap()
+
+    def tearDown(self):
+        hpf, btcore, bpt, node0, root = self.para
+        hpf.write_node(node0, bpt.to_bytes())
+        print("b+tree", bpt)
+        print("-" * 37)
+        hpf.close()
+
+    # helper
+
+    def _create_heap(self):
+        hpf = HeapFile(fnam).create()
+        hpf.close()
+
+        hpf = HeapFile(fnam).open()
+
+        node0 = hpf.alloc(0x50, data="not empty first node".encode())
+        self.assertNotEqual(node0, None)
+
+        btcore = BTreeCoreFile(hpf)  # , keys_per_node=3)
+
+        conv_key = ConvertOrderedKey()
+        conv_data = ConvertInteger()
+
+        bpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=conv_data)
+
+        root = bpt.create_new()
+
+        return hpf, btcore, bpt, node0, root
+
+    def _check_order(self, values, ordered=False):
+        enc = list(map(encode_key, values))
+        for v, e in zip(values, enc):
+            self.assertEqual(decode_key(e), v)
+        if ordered == True:
+            # mixed types can not be sorted in python
+            self.assertEqual(enc, sorted(set(enc)))
+            return
+        self.assertEqual(
+            sorted(range(0, len(values)), key=lambda i: values[i]),
+            sorted(range(0, len(values)), key=lambda i: enc[i]),
+        )
+
+    # tests
+
+    def test_0000_scalars(self):
+        ints = [0, 1, -1, 255, 256, -256, 2**63 - 1, -(2**63)]
+        ints.extend(random.randint(-(2**40), 2**40) for i in range(0, 200))
+        self._check_order(sorted(set(ints)))
+
+        floats = [0.0, 1.5, -1.5, 1e300, -1e300, 1e-300, -1e-300]
+        floats.extend(random.uniform(-1e6, 1e6) for i in range(0, 200))
+        self._check_order(floats)
+
+        strs = ["", "a", "a\x00", "a\x00b", "ab", "b", "\x00", "ä", "z" * 100]
+        self._check_order(strs)
+        self._check_order(list(map(lambda x: x.encode(), strs)))
+
+        self.assertEqual(decode_key(encode_key(None)), None)
+        with self.assertRaises(Exception):
+            encode_key(2**64)
+        with self.assertRaises(Exception):
+            encode_key(object())
+
+    def test_0010_tuples(self):
+        values = [
+            (),
+            (None,),
+            (None, 1),
+            ("a", -1),
+            ("a", 1),
+            (1,),
+            (1, None),
+            (1, "a"),
+            (1, "a", 2.5),
+            (1, "a\x00"),
+            (1, "b"),
+            (1, ("x", None)),
+            (1, ("x", 1)),
+            (2,),
+        ]
+        self._check_order(values, ordered=True)
+        for v in values:
+            # single values and one element tuples differ
+            self.assertNotEqual(encode_key(v), encode_key(v[0]) if len(v) else b"")
+
+    def test_0020_zero(self):
+        self.assertEqual(encode_key(-0.0), encode_key(0.0))
+        self.assertEqual(encode_key((-0.0, 1)), encode_key((0.0, 1)))
+        self.assertTrue(encode_key(-1e-300) < encode_key(-0.0) < encode_key(1e-300))
+
+    def test_0030_ordered_key(self):
+        a, b = OrderedKey.of((1, "a")), OrderedKey.of((None, "b"))
+        self.assertTrue(b < a)
+        self.assertTrue(b < (1, "a") and (1, "a") > b)
+        self.assertEqual(a, (1, "a"))
+        self.assertEqual((1, "a"), a)
+        self.assertNotEqual(a, object())
+        self.assertEqual(hash(a), hash((1, "a")))
+        self.assertEqual(a.value, (1, "a"))
+        # ordered as encoded, ints before floats
+        self.assertTrue(OrderedKey.of(2) < 1.5)
+
+    def test_0100_composite_keys(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        cnt = btcore.keys_per_node * 8
+        keys = [(i % 7, "name" + str(i), i) for i in range(0, cnt)]
+        random.shuffle(keys)
+        for key in keys:
+            bpt.put(key, key[2])
+
+        found = list(map(lambda x: x.key, bpt.iter_first()))
+        self.assertEqual(found, sorted(keys))
+
+        found = list(map(lambda x: x.key, bpt.iter_range((3,), (4,))))
+        self.assertEqual(found, sorted(filter(lambda x: x[0] == 3, keys)))
+
+    def test_0110_byte_keys(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        conv_key = ConvertKeyBytes()
+        nbpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=ConvertInteger())
+        nbpt.create_new()
+
+        values = [(i % 5, -i / 3) for i in range(0, btcore.keys_per_node * 8)]
+        random.shuffle(values)
+        for i, value in enumerate(values):
+            nbpt.put(encode_key(value), i)
+
+        found = list(map(lambda x: decode_key(x.key), nbpt.iter_first()))
+        self.assertEqual(found, sorted(values))
+
+        n, _, rc, ctx = nbpt.search_node(encode_key(values[0]))
+        self.assertTrue(rc)
+        self.assertEqual(n.data, 0)
+
+    def test_0120_mixed_keys(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        keys = [(1, "a"), (None, "b"), None, "x", b"y", (1, None), -0.0]
+        keys.extend(range(0, btcore.keys_per_node * 4))
+        keys.extend(i / 7 + 0.5 for i in range(0, btcore.keys_per_node * 4))
+        random.shuffle(keys)
+        for i, key in enumerate(keys):
+            bpt.put(key, i)
+        self.assertEqual(bpt.count, len(keys))
+
+        # in the order of the encoding
+        found = list(map(lambda x: x.key.buf, bpt.iter_first()))
+        self.assertEqual(found, sorted(map(encode_key, keys)))
+
+        for i, key in enumerate(keys):
+            for search in [key, OrderedKey.of(key)]:
+                n, _, rc, ctx = bpt.search_node(search)
+                self.assertTrue(rc, key)
+                self.assertEqual(n.key.value, key)
+                self.assertEqual(n.data, i)
+
+        n, _, rc, ctx = bpt.search_node(0.0)
+        self.assertTrue(rc)
+        self.assertTrue(bpt.verify().ok)
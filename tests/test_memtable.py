@@ -0,0 +1,179 @@
+import unittest
+import random
+
+from pybtreeplus.bptree import HeapFile, BPlusTree, BTreeCoreFile, Node, NodeList
+from pybtreeplus.memtable import MemTable, TOMBSTONE
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+class BTreePlusMemTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.para = self._create_heap()
+
+    def tearDown(self):
+        hpf, btcore, bpt, node0, root = self.para
+        hpf.write_node(node0, bpt.to_bytes())
+        print("b+tree", bpt)
+        print("-" * 37)
+        hpf.close()
+
+    # helper
+
+    def _create_heap(self):
+        hpf = HeapFile(fnam).create()
+        hpf.close()
+
+        hpf = HeapFile(fnam).open()
+
+        node0 = hpf.alloc(0x50, data="not empty first node".encode())
+        self.assertNotEqual(node0, None)
+
+        btcore = BTreeCoreFile(hpf)  # , keys_per_node=3)
+
+        conv_key = ConvertStr()
+        conv_data = ConvertInteger()
+
+        bpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=conv_data)
+
+        root = bpt.create_new()
+
+        return hpf, btcore, bpt, node0, root
+
+    # tests
+
+    def _test_data(self, i):
+        return "hello" + str(i).zfill(5), i
+
+    def test_0000_put_get_delete(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mt = MemTable(bpt, max_keys=0x10000)
+
+        elems = list(range(0, btcore.keys_per_node * 8))
+        random.shuffle(elems)
+        for i in elems[: len(elems) // 2]:
+            bpt.put(*self._test_data(i))
+        for i in elems[len(elems) // 2 :]:
+            mt.put(*self._test_data(i))
+        self.assertEqual(len(mt), len(elems) - len(elems) // 2)
+        self.assertEqual(bpt.count, len(elems) // 2)
+
+        # buffered keys hide the keys in the tree
+        deleted = set(elems[::3])
+        for i in deleted:
+            mt.delete(self._test_data(i)[0])
+        mt.put(self._test_data(elems[1])[0], -1)
+
+        def _expected(i):
+            if i in deleted:
+                return None
+            return -1 if i == elems[1] else i
+
+        for i in elems:
+            key = self._test_data(i)[0]
+            self.assertEqual(mt.get(key), _expected(i))
+            self.assertEqual(mt.contains(key), i not in deleted)
+        self.assertEqual(mt.get("missing", 7), 7)
+        keys = [self._test_data(i)[0] for i in elems] + ["missing"]
+        self.assertEqual(mt.get_many(keys), list(map(_expected, elems)) + [None])
+
+        expected = [(self._test_data(i)[0], _expected(i)) for i in sorted(elems)]
+        expected = list(filter(lambda x: x[1] != None, expected))
+        self.assertEqual(list(mt), expected)
+        lower, upper = self._test_data(20)[0], self._test_data(100)[0]
+        self.assertEqual(
+            list(mt.iter_range(lower, upper)),
+            list(filter(lambda x: lower < x[0] <= upper, expected)),
+        )
+
+        # merged into the tree, reads stay the same
+        self.assertTrue(mt.flush() > 0)
+        self.assertEqual(len(mt), 0)
+        self.assertEqual(mt.flushes, 1)
+        self.assertEqual(bpt.count, len(expected))
+        self.assertEqual(list(mt), expected)
+        pairs = list(map(lambda n: (n.key, n.data), bpt.iter_first()))
+        self.assertEqual(pairs, expected)
+
+        verifier = bpt.verify()
+        self.assertTrue(verifier.ok, verifier.errors)
+
+    def test_0010_flush_on_max_keys(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mt = MemTable(bpt, max_keys=btcore.keys_per_node * 2)
+
+        samples = {}
+        for _ in range(0, btcore.keys_per_node * 40):
+            i = random.randint(0, btcore.keys_per_node * 10)
+            key, data = self._test_data(i)
+            if random.random() < 0.3:
+                mt.delete(key)
+                samples.pop(key, None)
+            else:
+                mt.put(key, data)
+                samples[key] = data
+            self.assertTrue(len(mt) < btcore.keys_per_node * 2)
+        self.assertTrue(mt.flushes > 0)
+
+        self.assertEqual(list(mt), sorted(samples.items()))
+        mt.flush()
+        self.assertEqual(bpt.count, len(samples))
+        self.assertEqual(list(mt), sorted(samples.items()))
+
+        verifier = bpt.verify()
+        self.assertTrue(verifier.ok, verifier.errors)
+
+    def test_0020_write_batch(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        items = [self._test_data(i) for i in range(0, btcore.keys_per_node * 4)]
+        random.shuffle(items)
+
+        writes = []
+        write_elem = bpt._write_elem
+
+        def _write_elem(btelem):
+            writes.append(btelem.elem.pos)
+            return write_elem(btelem)
+
+        bpt._write_elem = _write_elem
+
+        # every element is written once
+        self.assertEqual(bpt.write_batch(items), len(items))
+        self.assertEqual(len(writes), len(set(writes)))
+        self.assertEqual(bpt.count, len(items))
+
+        deletes = [(key, TOMBSTONE) for key, data in items[::2]]
+        deletes.append(("missing", TOMBSTONE))
+        self.assertEqual(bpt.write_batch(deletes), len(items[::2]))
+        self.assertEqual(bpt.count, len(items) - len(items[::2]))
+        for key, data in items[::2]:
+            self.assertFalse(bpt.contains(key))
+
+        verifier = bpt.verify()
+        self.assertTrue(verifier.ok, verifier.errors)
+
+    def test_0030_data_equal_to_all(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        class _EqualAll(int):
+            def __eq__(self, other):
+                return True
+
+            __hash__ = int.__hash__
+
+        mt = MemTable(bpt)
+        mt.put("a", _EqualAll(1))
+        mt.delete("b")
+        self.assertEqual(int(mt.get("a")), 1)
+        self.assertTrue(mt.contains("a"))
+        self.assertFalse(mt.contains("b"))
+        self.assertEqual(list(map(lambda x: x[0], mt)), ["a"])
+
+        # stored, not taken as delete
+        self.assertEqual(mt.flush(), 1)
+        self.assertEqual(bpt.count, 1)
+        self.assertEqual(mt.get("a"), 1)
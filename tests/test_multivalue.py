@@ -0,0 +1,136 @@
+import unittest
+import random
+
+from pybtreeplus.bptree import HeapFile, BPlusTree, BTreeCoreFile, Node, NodeList
+from pybtreeplus.bptree import Context
+from pybtreeplus.multivalue import MultiValueTree
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+class BTreePlusMultiValueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.para = self._create_heap()
+
+    def tearDown(self):
+        hpf, btcore, bpt, node0, root = self.para
+        hpf.write_node(node0, bpt.to_bytes())
+        print("b+tree", bpt)
+        print("-" * 37)
+        hpf.close()
+
+    # helper
+
+    def _create_heap(self):
+        hpf = HeapFile(fnam).create()
+        hpf.close()
+
+        hpf = HeapFile(fnam).open()
+
+        node0 = hpf.alloc(0x50, data="not empty first node".encode())
+        self.assertNotEqual(node0, None)
+
+        btcore = BTreeCoreFile(hpf)  # , keys_per_node=3)
+
+        conv_key = ConvertStr()
+        conv_data = ConvertInteger()
+
+        bpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=conv_data)
+
+        root = bpt.create_new()
+
+        return hpf, btcore, bpt, node0, root
+
+    # tests
+
+    def test_0000_add_and_iter(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mvt = MultiValueTree(bpt, conv_value=ConvertInteger())
+
+        samples = {}
+        elems = [(random.choice(["open", "closed", "hold"]), i) for i in range(0, 500)]
+        for key, value in elems:
+            mvt.add(key, value)
+            samples.setdefault(key, []).append(value)
+
+        for key, values in samples.items():
+            self.assertEqual(mvt.count(key), len(values))
+            self.assertEqual(mvt.get(key), values)
+
+        self.assertEqual(mvt.count("missing"), 0)
+        self.assertEqual(mvt.get("missing"), [])
+
+        pairs = list(mvt.iter_first())
+        self.assertEqual(len(pairs), len(elems))
+        self.assertEqual([k for k, v in pairs], sorted(k for k, v in elems))
+
+    def test_0010_remove(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mvt = MultiValueTree(bpt, conv_value=ConvertInteger())
+
+        for i in range(0, 100):
+            mvt.add("key" + str(i % 3), i)
+
+        self.assertTrue(mvt.remove("key1"))
+        self.assertFalse(mvt.remove("key1"))
+        self.assertEqual(mvt.get("key1"), [])
+        self.assertEqual(mvt.count("key0"), 34)
+
+    def test_0020_value_larger_than_next_page(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mvt = MultiValueTree(bpt, first_page=0x40, max_page=0x400)
+
+        values = [bytes([1] * 10), bytes([2] * 200), bytes([3] * 10)]
+        for value in values:
+            mvt.add("key", value)
+        self.assertEqual(mvt.get("key"), values)
+
+        with self.assertRaises(Exception):
+            mvt.add("key", bytes(0x400))
+        self.assertEqual(mvt.count("key"), len(values))
+
+    def test_0030_abort(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        mvt = MultiValueTree(bpt, conv_value=ConvertInteger())
+
+        freed = []
+        postings_free = mvt.postings.free
+
+        def _free(head_pos):
+            freed.append(head_pos)
+            postings_free(head_pos)
+
+        mvt.postings.free = _free
+
+        for i in range(0, 10):
+            mvt.add("key", i)
+        head_pos = mvt._head_pos("key")
+
+        # the posting list stays with the key restored
+        n, btelem, rc, ctx = bpt.search_node("key")
+        self.assertTrue(mvt.remove("key", ctx=ctx, ctx_close=False))
+        self.assertEqual(freed, [])
+        ctx.abort()
+        self.assertEqual(mvt.get("key"), list(range(0, 10)))
+        self.assertEqual(freed, [])
+
+        # the posting list of a new key is dropped with it
+        ctx = Context(bpt)
+        mvt.add("new", 1, ctx=ctx, ctx_close=False)
+        new_pos = mvt._head_pos("new", ctx=ctx)
+        ctx.abort()
+        self.assertEqual(freed, [new_pos])
+        self.assertEqual(mvt.get("new"), [])
+
+        # freed when the context is done
+        ctx = Context(bpt)
+        self.assertTrue(mvt.remove("key", ctx=ctx, ctx_close=False))
+        self.assertEqual(freed, [new_pos])
+        ctx.done()
+        self.assertEqual(freed, [new_pos, head_pos])
+        self.assertEqual(mvt.get("key"), [])
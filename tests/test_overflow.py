@@ -0,0 +1,136 @@
+import unittest
+import io
+
+from pybtreeplus.bptree import HeapFile, BPlusTree, BTreeCoreFile, Node, NodeList
+from pybtreeplus.overflow import OverflowStore, OverflowRef, ConvertOverflow
+from pybtreecore.conv import ConvertStr, ConvertInteger, ConvertFloat, ConvertComplex
+
+fnam = "mytest.hpf"
+
+
+class BTreePlusOverflowTestCase(unittest.TestCase):
+    def setUp(self):
+        self.para = self._create_heap()
+
+    def tearDown(self):
+        hpf, btcore, bpt, node0, root = self.para
+        hpf.write_node(node0, bpt.to_bytes())
+        print("b+tree", bpt)
+        print("-" * 37)
+        hpf.close()
+
+    # helper
+
+    def _create_heap(self):
+        hpf = HeapFile(fnam).create()
+        hpf.close()
+
+        hpf = HeapFile(fnam).open()
+
+        node0 = hpf.alloc(0x50, data="not empty first node".encode())
+        self.assertNotEqual(node0, None)
+
+        btcore = BTreeCoreFile(hpf)  # , keys_per_node=3)
+
+        store = OverflowStore(hpf, btcore.fd.link_size, page_size=0x100)
+
+        conv_key = ConvertStr()
+        conv_data = ConvertOverflow(store, conv=ConvertStr())
+
+        bpt = BPlusTree(btcore=btcore, conv_key=conv_key, conv_data=conv_data)
+
+        root = bpt.create_new()
+
+        return hpf, btcore, bpt, node0, root
+
+    # tests
+
+    def test_0000_inline_and_overflow(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        conv = bpt.conv_data
+
+        small = "small"
+        large = "large" * 1000
+
+        self.assertEqual(conv.wrap(small), small)
+        ref = conv.wrap(large)
+        self.assertTrue(isinstance(ref, OverflowRef))
+        self.assertEqual(ref.size, len(large))
+
+        bpt.put("a", small)
+        bpt.put("b", ref)
+
+        node, btelem, rc, ctx = bpt.search_node("a")
+        self.assertTrue(rc)
+        self.assertEqual(node.data, small)
+
+        node, btelem, rc, ctx = bpt.search_node("b")
+        self.assertTrue(rc)
+        self.assertTrue(isinstance(node.data, OverflowRef))
+        self.assertEqual(node.data.value(), large)
+
+    def test_0010_stream(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        conv = bpt.conv_data
+
+        blob = bytes(range(0, 256)) * 40
+        bpt.put("blob", conv.store.write_stream(io.BytesIO(blob)))
+
+        node, btelem, rc, ctx = bpt.search_node("blob")
+        self.assertTrue(rc)
+
+        chunks = list(node.data.iter_chunks())
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(bytes().join(chunks), blob)
+
+        node.data.free()
+
+    def test_0020_too_large_inline(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        with self.assertRaises(Exception):
+            bpt.put("x", "large" * 1000)
+
+    def test_0030_free_on_replace_and_delete(self):
+        hpf, btcore, bpt, node0, root = self.para
+
+        conv = bpt.conv_data
+        store = conv.store
+
+        freed = []
+        store_free = store.free
+
+        def _free(pos):
+            freed.append(pos)
+            store_free(pos)
+
+        store.free = _free
+
+        ref1 = conv.wrap("first" * 1000)
+        bpt.put("a", ref1)
+        # the same reference again is kept
+        bpt.put("a", ref1)
+        self.assertEqual(freed, [])
+
+        ref2 = conv.wrap("second" * 1000)
+        bpt.put("a", ref2)
+        self.assertEqual(freed, [ref1.pos])
+
+        # replaced by an inline value
+        bpt.put("a", "small")
+        self.assertEqual(freed, [ref1.pos, ref2.pos])
+
+        # not freed by an aborted context
+        ref3 = conv.wrap("third" * 1000)
+        bpt.put("b", ref3)
+        n, btelem, rc, ctx = bpt.search_node("b")
+        bpt.delete_from_leaf("b", btelem, ctx=ctx, ctx_close=False)
+        ctx.abort()
+        self.assertEqual(len(freed), 2)
+
+        n, btelem, rc, ctx = bpt.search_node("b")
+        self.assertEqual(n.data.value(), "third" * 1000)
+        bpt.delete_from_leaf("b", btelem, ctx=ctx)
+        self.assertEqual(freed, [ref1.pos, ref2.pos, ref3.pos])